@@ -3,9 +3,11 @@
 清理日志文件脚本
 按照 delete_log_files 的逻辑，清理所有具有相同 request_id 的相关文件
 """
+import os
 import sys
 import re
 from pathlib import Path
+from typing import Dict, List, Tuple
 
 # 添加项目路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -13,37 +15,78 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from config.paths import DATA_BACKEND_DIR, DATA_FRONTEND_DIR, DATA_EXPORT_DIR, DATA_RETRIEVAL_DIR, DATA_EVALUATION_DIR
 from services.format_converter import delete_log_files
 
-def extract_request_id_from_txt(txt_file: Path) -> str:
-    """从 TXT 文件中提取 request_id"""
+_REQUEST_ID_RE = re.compile(r"请求ID:\s*([a-f0-9\-]+)", re.IGNORECASE)
+
+
+def _read_txt(txt_file: Path) -> str:
+    """读取 TXT 日志内容，失败时返回空字符串"""
     try:
         with open(txt_file, "r", encoding="utf-8") as f:
-            content = f.read()
-            match = re.search(r"请求ID:\s*([a-f0-9\-]+)", content, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
+            return f.read()
     except Exception as e:
         print(f"读取 {txt_file} 失败: {e}")
     return ""
 
-def list_all_logs():
-    """列出所有日志文件及其 request_id"""
-    logs = []
-    
-    # 从 backend 目录读取 TXT 文件
-    if DATA_BACKEND_DIR.exists():
-        for txt_file in DATA_BACKEND_DIR.glob("questions_*.txt"):
-            request_id = extract_request_id_from_txt(txt_file)
-            logs.append({
-                "file": txt_file,
-                "type": "TXT",
-                "request_id": request_id,
-                "request_id_prefix": request_id[:8] if len(request_id) >= 8 else request_id
-            })
-    
-    return logs
-
-def find_related_files(request_id: str, request_id_prefix: str):
-    """查找所有相关的文件"""
+
+def _request_id_from_content(content: str) -> str:
+    """从日志内容中提取 request_id"""
+    match = _REQUEST_ID_RE.search(content)
+    return match.group(1).strip() if match else ""
+
+
+def extract_request_id_from_txt(txt_file: Path) -> str:
+    """从 TXT 文件中提取 request_id"""
+    return _request_id_from_content(_read_txt(txt_file))
+
+# 目录扫描缓存：目录 -> [(文件名, 路径字符串)]，每个目录在一次运行中只扫描一次
+_DIR_ENTRIES: Dict[str, List[Tuple[str, str]]] = {}
+
+
+def _scan_dir(directory: Path) -> List[Tuple[str, str]]:
+    """使用 os.scandir 列出目录下的普通文件（结果缓存在模块级字典中）"""
+    key = str(directory)
+    entries = _DIR_ENTRIES.get(key)
+    if entries is None:
+        try:
+            with os.scandir(key) as it:
+                entries = [(e.name, e.path) for e in it if e.is_file(follow_symlinks=False)]
+        except (FileNotFoundError, NotADirectoryError):
+            entries = []
+        _DIR_ENTRIES[key] = entries
+    return entries
+
+
+def _match_entries(directory: Path, prefix: str, suffix: str) -> List[Tuple[str, str]]:
+    """按文件名前缀/后缀过滤目录项"""
+    return [(name, path) for name, path in _scan_dir(directory) if name.startswith(prefix) and name.endswith(suffix)]
+
+
+def scan_logs() -> Tuple[Dict[str, List[Path]], Dict[str, List[Path]]]:
+    """单次扫描 backend 目录下的 TXT 日志
+
+    返回 (grouped_by_rid, index_by_prefix)：
+    - grouped_by_rid: request_id -> 日志文件列表（无法提取 request_id 的文件归在空字符串键下）
+    - index_by_prefix: request_id 前 8 位 -> 内容中任意位置出现该前缀的日志文件列表，供 find_related_files 直接查找
+    """
+    grouped_by_rid: Dict[str, List[Path]] = {}
+    contents: List[Tuple[Path, str]] = []
+    for _, path in _match_entries(DATA_BACKEND_DIR, "questions_", ".txt"):
+        txt_file = Path(path)
+        content = _read_txt(txt_file)
+        grouped_by_rid.setdefault(_request_id_from_content(content), []).append(txt_file)
+        contents.append((txt_file, content))
+    
+    # 与逐组查找时的匹配规则一致：日志内容中任意位置出现 request_id 前缀即视为相关（在已读入的内容上匹配，不再重读文件）
+    prefixes = {request_id[:8] for request_id in grouped_by_rid if request_id}
+    index_by_prefix: Dict[str, List[Path]] = {}
+    for txt_file, content in contents:
+        for prefix in prefixes:
+            if prefix in content:
+                index_by_prefix.setdefault(prefix, []).append(txt_file)
+    return grouped_by_rid, index_by_prefix
+
+def find_related_files(request_id: str, request_id_prefix: str, index_by_prefix: Dict[str, List[Path]]):
+    """查找所有相关的文件（TXT 日志使用 scan_logs 预先构建的索引）"""
     related = {
         "txt_files": [],
         "json_files": [],
@@ -52,38 +95,28 @@ def find_related_files(request_id: str, request_id_prefix: str):
         "evaluation_files": []
     }
     
-    # TXT 文件
-    if DATA_BACKEND_DIR.exists():
-        for txt_file in DATA_BACKEND_DIR.glob("questions_*.txt"):
-            if request_id_prefix in txt_file.stem or request_id in txt_file.stem:
-                related["txt_files"].append(txt_file)
-            else:
-                # 检查内容
-                try:
-                    with open(txt_file, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        if request_id_prefix in content or request_id in content:
-                            related["txt_files"].append(txt_file)
-                except:
-                    pass
+    # TXT 文件：内容中记录了该 request_id 的日志 + 文件名中包含该 ID 的日志
+    txt_files = list(index_by_prefix.get(request_id_prefix, []))
+    seen = {str(p) for p in txt_files}
+    for name, path in _match_entries(DATA_BACKEND_DIR, "questions_", ".txt"):
+        if path not in seen and (request_id_prefix in name or request_id in name):
+            txt_files.append(Path(path))
+    related["txt_files"] = txt_files
     
     # JSON 文件
-    if DATA_FRONTEND_DIR.exists():
-        for json_file in DATA_FRONTEND_DIR.glob("questions_*.json"):
-            if request_id_prefix in json_file.stem or request_id in json_file.stem:
-                related["json_files"].append(json_file)
+    for name, path in _match_entries(DATA_FRONTEND_DIR, "questions_", ".json"):
+        if request_id_prefix in name or request_id in name:
+            related["json_files"].append(Path(path))
     
     # CSV 文件（export）
-    if DATA_EXPORT_DIR.exists():
-        for csv_file in DATA_EXPORT_DIR.glob("questions_*.csv"):
-            if request_id_prefix in csv_file.stem or request_id in csv_file.stem:
-                related["csv_files"].append(csv_file)
+    for name, path in _match_entries(DATA_EXPORT_DIR, "questions_", ".csv"):
+        if request_id_prefix in name or request_id in name:
+            related["csv_files"].append(Path(path))
     
     # 检索结果文件
-    if DATA_RETRIEVAL_DIR.exists():
-        for csv_file in DATA_RETRIEVAL_DIR.glob("*_with_answers.csv"):
-            if request_id_prefix in csv_file.stem or request_id in csv_file.stem:
-                related["retrieval_files"].append(csv_file)
+    for name, path in _match_entries(DATA_RETRIEVAL_DIR, "", "_with_answers.csv"):
+        if request_id_prefix in name or request_id in name:
+            related["retrieval_files"].append(Path(path))
     
     # 评测结果文件
     if DATA_EVALUATION_DIR.exists():
@@ -103,26 +136,23 @@ def main():
     print("=" * 60)
     print()
     
-    # 列出所有日志
-    logs = list_all_logs()
+    # 单次扫描日志目录，同时得到按 request_id 分组的结果和前缀索引
+    grouped, index_by_prefix = scan_logs()
+    
+    total_logs = sum(len(files) for files in grouped.values())
+    if total_logs:
+        print(f"找到 {total_logs} 个日志文件：\n")
     
-    if not logs:
+    if not total_logs:
         print("没有找到日志文件")
         return
     
-    print(f"找到 {len(logs)} 个日志文件：\n")
+    for log_file in grouped.pop("", []):
+        print(f"⚠️  {log_file.name}: 无法提取 request_id")
     
-    # 按 request_id 分组
-    grouped = {}
-    for log in logs:
-        request_id = log["request_id"]
-        if not request_id:
-            print(f"⚠️  {log['file'].name}: 无法提取 request_id")
-            continue
-        
-        if request_id not in grouped:
-            grouped[request_id] = []
-        grouped[request_id].append(log)
+    if not grouped:
+        print("没有可提取 request_id 的日志文件")
+        return
     
     print(f"共 {len(grouped)} 个不同的 request_id：\n")
     
@@ -132,7 +162,7 @@ def main():
         print(f"  日志文件: {len(log_list)} 个")
         
         # 查找所有相关文件
-        related = find_related_files(request_id, request_id[:8])
+        related = find_related_files(request_id, request_id[:8], index_by_prefix)
         
         total_files = (
             len(related["txt_files"]) +
@@ -170,7 +200,7 @@ def main():
         print("\n开始清理所有日志文件...")
         for request_id, log_list in grouped.items():
             # 使用第一个日志文件作为入口
-            log_file = log_list[0]["file"]
+            log_file = log_list[0]
             print(f"\n清理 {request_id[:8]}... ({log_file.name})")
             result = delete_log_files(str(log_file))
             print(f"  结果: {result}")
@@ -183,7 +213,7 @@ def main():
         for request_id, log_list in grouped.items():
             if request_id.startswith(request_id_input) or request_id_input in request_id:
                 found = True
-                log_file = log_list[0]["file"]
+                log_file = log_list[0]
                 print(f"\n清理 {request_id}... ({log_file.name})")
                 result = delete_log_files(str(log_file))
                 print(f"  结果: {result}")
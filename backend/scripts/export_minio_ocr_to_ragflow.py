@@ -42,9 +42,11 @@ Usage (from backend directory, after activating venv and configuring .env for Mi
 """
 
 import csv
+import io
 import json
+import re
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from typing import Any, List, Tuple, Dict, Optional
 
 from dotenv import load_dotenv
 
@@ -81,6 +83,39 @@ def map_source_file_to_dataset_name(source_file: str, mappings: List[Dict[str, s
     return source_file
 
 
+# 导出 CSV 的写缓冲大小
+_CSV_WRITE_BUFFER = 1 << 20
+
+# 常见 heading 形如 "13.2 配件"：直接取第一层编号，未命中时再交给 ChapterMatcher
+_FAST_CHAPTER_RE = re.compile(r"^\s*(\d+)(?:\.\d+)*\s")
+
+# index.json 中真正需要的字段（preview 等大字段不保留）
+_INDEX_HEADER_KEYS = ("source_file", "ocr_task_id")
+_SEGMENT_KEYS = ("id", "heading", "file")
+
+
+def parse_index_json(index_text: str) -> Optional[Dict[str, Any]]:
+    """解析 segments/index.json，只保留 source_file、ocr_task_id 和每个 segment 的 id/heading/file。
+
+    解析失败或结构不符时返回 None。
+    """
+    try:
+        data = json.loads(index_text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    segments = data.get("segments") or []
+    if not isinstance(segments, list):
+        return None
+    result = {key: data.get(key) for key in _INDEX_HEADER_KEYS}
+    result["segments"] = [
+        {key: seg.get(key) for key in _SEGMENT_KEYS} if isinstance(seg, dict) else seg
+        for seg in segments
+    ]
+    return result
+
+
 def export_minio_ocr_to_ragflow_csv(output_dir: Path) -> Path:
     """Export OCR segments from MinIO to a single CSV suitable for RagFlow import."""
     load_dotenv()
@@ -113,12 +148,8 @@ def export_minio_ocr_to_ragflow_csv(output_dir: Path) -> Path:
         if not index_text:
             continue
 
-        try:
-            data = json.loads(index_text)
-        except json.JSONDecodeError:
-            continue
-
-        if not isinstance(data, dict):
+        data = parse_index_json(index_text)
+        if data is None:
             continue
 
         # 推导当前 OCR 结果在 MinIO 中的根前缀，用于补全 seg_file
@@ -136,6 +167,8 @@ def export_minio_ocr_to_ragflow_csv(output_dir: Path) -> Path:
 
         # 根据映射规则将 source_file 映射到更抽象的主题名（dataset 名称）
         dataset_name = map_source_file_to_dataset_name(source_file, dataset_mappings)
+        pdf_base = Path(source_file).stem  # 去掉 .pdf
+        fallback_doc_prefix = f"{pdf_base}__segment_"
 
         segments = data.get("segments") or []
         if not isinstance(segments, list):
@@ -158,21 +191,24 @@ def export_minio_ocr_to_ragflow_csv(output_dir: Path) -> Path:
             seg_id = (seg.get("id") or "").strip()
 
             # 从 heading 中提取章节信息，如 "13.2 配件" -> "13.2" 或 "13"
-            chapter_info = ChapterMatcher.extract_chapter_info(heading) or ""
-            major_chapter = ""
-            if chapter_info:
-                # 如果是类似 "13.2" 的结构，只取第一层 "13" 作为大章编号
-                if "." in chapter_info:
-                    major_chapter = chapter_info.split(".")[0]
-                else:
-                    major_chapter = chapter_info
-
-            pdf_base = Path(source_file).stem  # 去掉 .pdf
+            fast_match = _FAST_CHAPTER_RE.match(heading)
+            if fast_match:
+                major_chapter = fast_match.group(1)
+            else:
+                chapter_info = ChapterMatcher.extract_chapter_info(heading) or ""
+                major_chapter = ""
+                if chapter_info:
+                    # 如果是类似 "13.2" 的结构，只取第一层 "13" 作为大章编号
+                    if "." in chapter_info:
+                        major_chapter = chapter_info.split(".")[0]
+                    else:
+                        major_chapter = chapter_info
+
             if major_chapter:
                 document_name = f"{pdf_base}__{major_chapter}"
             else:
                 # 没有可靠章节信息时，退回到 heading / seg_id
-                document_name = heading or seg_id or f"{pdf_base}__segment_{idx:03d}"
+                document_name = heading or seg_id or f"{fallback_doc_prefix}{idx:03d}"
 
             # seg_file 在 index.json 中通常为相对路径（如 "ocr_result/077c1bfc/segments/segment_001.mmd"
             # 或仅 "segments/segment_001.mmd"），需要补上 case_id 前缀
@@ -190,10 +226,12 @@ def export_minio_ocr_to_ragflow_csv(output_dir: Path) -> Path:
     output_dir.mkdir(parents=True, exist_ok=True)
     output_csv = output_dir / "segments.csv"
 
-    with output_csv.open("w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["dataset_name", "document_name", "segment_index", "content"])
-        writer.writerows(rows)
+    # 使用 1MB 写缓冲，减少大批量导出时的 write 系统调用次数（utf-8-sig 编码会自动写入 BOM）
+    with open(output_csv, "wb", buffering=_CSV_WRITE_BUFFER) as raw:
+        with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="", write_through=False) as f:
+            writer = csv.writer(f)
+            writer.writerow(["dataset_name", "document_name", "segment_index", "content"])
+            writer.writerows(rows)
 
     return output_csv
 
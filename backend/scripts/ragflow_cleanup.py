@@ -14,16 +14,29 @@
 
   # 按前缀批量删除（例如所有以 "eCoder" 开头的知识库）
   python -m scripts.ragflow_cleanup --delete-prefix "eCoder"
+
+  # 删除后重新拉取列表确认结果
+  python -m scripts.ragflow_cleanup --delete-all --verify
 """
 
 from __future__ import annotations
 
 import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Dict, List
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+# 逐个删除回退路径的并发数
+DELETE_WORKERS = 8
+
+# 复用 TCP/TLS 连接（keep-alive），并发删除时各线程共享同一连接池
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_maxsize=DELETE_WORKERS))
+_session.mount("https://", HTTPAdapter(pool_maxsize=DELETE_WORKERS))
 
 
 def _request(
@@ -38,7 +51,7 @@ def _request(
     headers = {"Authorization": f"Bearer {api_key}"}
     if json_body is not None:
         headers["Content-Type"] = "application/json"
-    resp = requests.request(method, url, headers=headers, params=params, json=json_body, timeout=60)
+    resp = _session.request(method, url, headers=headers, params=params, json=json_body, timeout=60)
     resp.raise_for_status()
     if resp.content:
         try:
@@ -121,6 +134,7 @@ def main() -> None:
     parser.add_argument("--delete-dataset", type=str, help="按名称精确删除某个数据集")
     parser.add_argument("--delete-prefix", type=str, help="删除名称以该前缀开头的所有数据集")
     parser.add_argument("--delete-all", action="store_true", help="删除所有数据集（危险操作，需确认）")
+    parser.add_argument("--verify", action="store_true", help="删除后重新拉取数据集列表，确认删除结果")
     args = parser.parse_args()
 
     datasets = list_datasets(api_url, api_key)
@@ -170,10 +184,16 @@ def main() -> None:
 
     # 使用批量删除 API（更高效且可靠）
     print(f"\n正在批量删除 {len(dataset_ids_to_delete)} 个数据集...")
+    batch_ok = False
+    batch_unconfirmed = False
     try:
         result = delete_datasets_batch(api_url, api_key, dataset_ids_to_delete)
         print(f"[OK] 批量删除请求已提交")
+        batch_unconfirmed = not isinstance(result, dict) or "code" not in result
         if isinstance(result, dict):
+            # _request 已对 code != 0 抛错；但响应体为空或无法解析时返回 {}，
+            # 因此要求显式的 code == 0，并且没有逐项错误，才视为删除成功
+            batch_ok = result.get("code") == 0 and not result.get("errors")
             if "message" in result:
                 print(f"  消息: {result['message']}")
             if "success_count" in result:
@@ -187,21 +207,42 @@ def main() -> None:
     except Exception as e:
         print(f"[FAIL] 批量删除失败: {e}")
         print("尝试逐个删除...")
-        # 回退到逐个删除
-        success_count = 0
+        # 回退到逐个删除（并发发起请求）
+        valid_targets = []
         for ds in to_delete:
             ds_id = ds.get("id") or ds.get("dataset_id") or ds.get("_id")
             name = ds.get("name") or ds.get("dataset_name")
-            if not ds_id:
-                continue
-            try:
-                delete_dataset(api_url, api_key, ds_id)
-                print(f"[OK] 已删除数据集: {name} ({ds_id})")
-                success_count += 1
-            except Exception as e:
-                print(f"[FAIL] 删除数据集失败: {name} ({ds_id}) - {e}")
+            if ds_id:
+                valid_targets.append((ds_id, name))
+        success_count = 0
+        done_count = 0
+        with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+            futures = {
+                executor.submit(delete_dataset, api_url, api_key, ds_id): (ds_id, name)
+                for ds_id, name in valid_targets
+            }
+            for future in as_completed(futures):
+                ds_id, name = futures[future]
+                done_count += 1
+                try:
+                    future.result()
+                    print(f"[OK] ({done_count}/{len(valid_targets)}) 已删除数据集: {name} ({ds_id})")
+                    success_count += 1
+                except Exception as e:
+                    print(f"[FAIL] ({done_count}/{len(valid_targets)}) 删除数据集失败: {name} ({ds_id}) - {e}")
         print(f"\n删除完成: {success_count}/{len(dataset_ids_to_delete)} 成功")
 
+    # 批量删除的响应已给出结果，只有显式 --verify 时才重新全量拉取列表；
+    # 响应中没有 code（空响应体等）时无法判断是否删除成功，自动验证
+    if batch_unconfirmed and not args.verify:
+        print("[WARN] 批量删除响应中没有结果状态，自动验证删除结果")
+    elif not args.verify:
+        if batch_ok:
+            print("[OK] 全部删除成功 (trusted)")
+        else:
+            print("如需确认剩余数据集，请使用 --verify 重新运行或执行 --list")
+        return
+
     # 验证删除结果
     print("\n验证删除结果...")
     remaining = list_datasets(api_url, api_key)
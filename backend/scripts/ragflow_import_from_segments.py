@@ -29,18 +29,66 @@
 
 from __future__ import annotations
 
+import asyncio
 import csv
+import gzip
+import importlib.util
 import json
 import os
+import re
 import sys
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Tuple
 import hashlib
 
+import httpx
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+  from requests_toolbelt import MultipartEncoder
+except ImportError:  # pragma: no cover - 未安装时 upload_file 退回 files= 方式
+  MultipartEncoder = None
+
+try:
+  import orjson
+except ImportError:  # pragma: no cover - 未安装时使用标准库 json
+  orjson = None
+
+try:
+  import pandas as pd
+except ImportError:  # pragma: no cover - 未安装 pandas 时退回标准库 csv
+  pd = None
+
+
+# 连接池大小：需不小于并发上传的线程数
+HTTP_POOL_SIZE = 50
+# 写 chunk 阶段同时在途的请求数（同时也是 AsyncClient 的连接数上限）
+CHUNK_CONCURRENCY = int(os.getenv("RAGFLOW_CHUNK_CONCURRENCY", "50"))
+# 上传文件时用 gzip 压缩请求体（需 RagFlow 前端代理支持 Content-Encoding: gzip，默认关闭）
+UPLOAD_GZIP = os.getenv("RAGFLOW_UPLOAD_GZIP", "false").lower() == "true"
+# pandas 分块读取 segments.csv 时每块的行数
+CSV_CHUNK_ROWS = 50_000
+# 同步 datasets.json 时并发获取文档列表的线程数
+SYNC_WORKERS = 8
+
+
+def build_session(api_key: str) -> requests.Session:
+  """创建带连接池和重试的 Session，所有 RagFlow 请求复用同一批 keep-alive 连接。"""
+  session = requests.Session()
+  session.headers.update({"Authorization": f"Bearer {api_key}"})
+  retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], raise_on_status=False)
+  adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+  session.mount("http://", adapter)
+  session.mount("https://", adapter)
+  return session
 
 
 @dataclass
@@ -51,75 +99,207 @@ class SegmentRow:
   content: str
 
 
-def load_segments(csv_path: Path) -> List[SegmentRow]:
-  # 有些段落非常长，超过 csv 模块默认的 128KB 限制，这里放宽限制
-  try:
-    csv.field_size_limit(sys.maxsize)
-  except (OverflowError, ValueError):
-    csv.field_size_limit(10_000_000)
+def _raise_csv_field_size_limit() -> int:
+  """放宽 csv 模块的单字段长度限制并返回实际生效的上限。
+
+  有些段落非常长，超过 csv 模块默认的 128KB 限制。上限默认取 sys.maxsize，
+  可通过 RAGFLOW_CSV_FIELD_LIMIT 覆盖；在 C long 为 32 位的平台上 sys.maxsize
+  会溢出，此时逐步缩小到平台可接受的最大值，而不是退回固定的 10MB。
+  """
+  max_int = int(os.getenv("RAGFLOW_CSV_FIELD_LIMIT", str(sys.maxsize)))
+  while True:
+    try:
+      csv.field_size_limit(max_int)
+      return max_int
+    except OverflowError:
+      max_int //= 10
+
+
+SEGMENT_COLUMNS = ["dataset_name", "document_name", "segment_index", "content"]
+
+
+def iter_segments(csv_path: Path) -> Iterator[SegmentRow]:
+  """逐行读取 segments.csv，不在内存中保留整张表；需要再次遍历时重新调用即可。
+
+  优先使用 pandas 的 C 解析器按块读取，未安装 pandas 时退回 csv.DictReader。
+  只返回 dataset_name、document_name、content 均非空的行。
+  """
+  if pd is None:
+    yield from _iter_segments_stdlib(csv_path)
+    return
+
+  header = pd.read_csv(csv_path, encoding="utf-8-sig", nrows=0)
+  if not set(SEGMENT_COLUMNS).issubset(header.columns):
+    raise ValueError(f"segments.csv 缺少必要列: {set(SEGMENT_COLUMNS)}")
+
+  reader = pd.read_csv(
+    csv_path,
+    encoding="utf-8-sig",
+    usecols=SEGMENT_COLUMNS,
+    dtype=str,
+    keep_default_na=False,
+    chunksize=CSV_CHUNK_ROWS,
+  )
+  with reader:
+    for chunk in reader:
+      # 按列整体清洗，避免逐行 strip()/int()
+      for col in ("dataset_name", "document_name", "content"):
+        chunk[col] = chunk[col].str.strip()
+      # 缺少数据集名、文档名或内容的行在下游都会被跳过，这里按列一次过滤掉
+      chunk = chunk[
+        chunk["dataset_name"].astype(bool) & chunk["document_name"].astype(bool) & chunk["content"].astype(bool)
+      ]
+      if chunk.empty:
+        continue
+      chunk["segment_index"] = pd.to_numeric(chunk["segment_index"], errors="coerce").fillna(0).astype(int)
+      for ds_name, doc_name, seg_idx, content in zip(
+        chunk["dataset_name"].tolist(),
+        chunk["document_name"].tolist(),
+        chunk["segment_index"].tolist(),
+        chunk["content"].tolist(),
+      ):
+        yield SegmentRow(
+          dataset_name=ds_name,
+          document_name=doc_name,
+          segment_index=seg_idx,
+          content=content,
+        )
+
+
+def _iter_segments_stdlib(csv_path: Path) -> Iterator[SegmentRow]:
+  _raise_csv_field_size_limit()
 
-  rows: List[SegmentRow] = []
   with csv_path.open("r", encoding="utf-8-sig") as f:
     reader = csv.DictReader(f)
-    required = {"dataset_name", "document_name", "segment_index", "content"}
+    required = set(SEGMENT_COLUMNS)
     if not required.issubset(reader.fieldnames or []):
       raise ValueError(f"segments.csv 缺少必要列: {required}")
     for r in reader:
+      ds_name = (r["dataset_name"] or "").strip()
+      doc_name = (r["document_name"] or "").strip()
+      content = (r["content"] or "").strip()
+      if not ds_name or not doc_name or not content:
+        continue
       try:
         seg_idx = int(r["segment_index"])
       except (TypeError, ValueError):
         seg_idx = 0
-      rows.append(
-        SegmentRow(
-          dataset_name=r["dataset_name"].strip(),
-          document_name=r["document_name"].strip(),
-          segment_index=seg_idx,
-          content=(r["content"] or "").strip(),
-        )
+      yield SegmentRow(
+        dataset_name=ds_name,
+        document_name=doc_name,
+        segment_index=seg_idx,
+        content=content,
       )
-  return rows
+
+
+# RagFlow 元数据库连接参数（用于硬删除同名文档/文件变体）
+RAGFLOW_DB_PARAMS = {
+  "host": "localhost",
+  "port": 5432,
+  "database": "zeroerr_meta",
+  "user": "zeroerr",
+  "password": "zero0000",
+  "options": "-c search_path=ragflow",
+}
+DB_POOL_MAX_CONN = 8
+
+# 匹配 "name(N)" 形式的变体名称，group(1) 为原始名称
+_VARIANT_SUFFIX_RE = re.compile(r"^(.*)\((\d+)\)$")
+
+
+def _name_variant_re(name: str) -> "re.Pattern[str]":
+  """编译一次即可同时匹配 name 本身和 name(N) 变体的正则。"""
+  return re.compile(rf"^{re.escape(name)}(?:\(\d+\))?$")
+
+
+def _escape_like(value: str) -> str:
+  """转义 LIKE 通配符，使名称按字面匹配。"""
+  return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 class RagFlowImporter:
   def __init__(self, api_url: str, api_key: str):
     self.api_url = api_url.rstrip("/")
     self.api_key = api_key
-    self.headers_json = {
-      "Authorization": f"Bearer {api_key}",
-      "Content-Type": "application/json",
-    }
+    # Session 已携带 Authorization 头；json= 参数会自动设置 Content-Type
+    self.session = build_session(api_key)
+    # 运行期内的列表缓存：新建/删除数据集或文档时失效
+    self._datasets_cache: List[Dict] | None = None
+    self._docs_cache: Dict[str, List[Dict]] = {}
+    # dataset_name -> dataset_id，find_or_create_dataset 的快速路径
+    self._dataset_id_by_name: Dict[str, str] = {}
+    self._cache_lock = threading.Lock()
+    # dataset_id -> {base_name: [document_id]}，每个数据集只列一次文档
+    self._doc_index: Dict[str, Dict[str, List[str]]] = {}
+    self._doc_index_taken: Dict[str, set] = {}
+    # 服务端拒绝过 gzip 请求体后不再尝试
+    self._gzip_rejected = False
+    # 直连 RagFlow 数据库做硬删除时使用的连接池（按需创建）
+    self._db_pool = None
+
+  def _invalidate_datasets(self) -> None:
+    with self._cache_lock:
+      self._datasets_cache = None
+
+  def _invalidate_documents(self, dataset_id: str) -> None:
+    with self._cache_lock:
+      self._docs_cache.pop(dataset_id, None)
 
   def _post_json(self, path: str, payload: Dict) -> Dict:
     url = f"{self.api_url}{path}"
-    resp = requests.post(url, headers=self.headers_json, json=payload, timeout=60)
+    resp = self.session.post(url, json=payload, timeout=60)
     resp.raise_for_status()
     return resp.json()
 
   def _get_json(self, path: str, params: Dict | None = None) -> Dict:
     url = f"{self.api_url}{path}"
-    resp = requests.get(url, headers={"Authorization": f"Bearer {self.api_key}"}, params=params, timeout=60)
+    resp = self.session.get(url, params=params, timeout=60)
     resp.raise_for_status()
     return resp.json()
 
   def _delete_json(self, path: str) -> Dict:
     url = f"{self.api_url}{path}"
-    resp = requests.delete(url, headers={"Authorization": f"Bearer {self.api_key}"}, timeout=60)
+    resp = self.session.delete(url, timeout=60)
     resp.raise_for_status()
     if resp.content:
       return resp.json()
     return {}
 
+  @staticmethod
+  def _wait_until(check_fn, timeout: float = 10.0, start: float = 0.1) -> bool:
+    """轮询 check_fn 直到返回 True 或超时，间隔按指数退避（最长 1 秒）。"""
+    deadline = time.monotonic() + timeout
+    delay = start
+    while True:
+      if check_fn():
+        return True
+      if time.monotonic() >= deadline:
+        return False
+      time.sleep(delay)
+      delay = min(delay * 2, 1.0)
+
   # ---- Dataset management -------------------------------------------------
 
   def list_datasets(self) -> List[Dict]:
+    with self._cache_lock:
+      if self._datasets_cache is not None:
+        return self._datasets_cache
     data = self._get_json("/api/v1/datasets", params={"page": 1, "page_size": 100})
+    datasets: List[Dict] = []
     if isinstance(data, dict):
-      return data.get("data", []) or data.get("datasets", []) or []
-    return []
+      datasets = data.get("data", []) or data.get("datasets", []) or []
+    with self._cache_lock:
+      self._datasets_cache = datasets
+    return datasets
 
   def find_or_create_dataset(self, name: str, desc: str | None = None, delete_existing: bool = False) -> str:
-    import time
-    
+    # 已知名称且无需删除时直接返回，不再请求数据集列表
+    if not delete_existing:
+      with self._cache_lock:
+        known_id = self._dataset_id_by_name.get(name)
+      if known_id:
+        return known_id
+
     # Try find by name first（包括所有可能的变体：name, name(1), name(2) 等）
     existing_ds_id = None
     all_datasets = self.list_datasets()
@@ -130,61 +310,69 @@ class RagFlowImporter:
       ds_id = ds.get("id") or ds.get("dataset_id") or ds.get("_id")
       if ds_name == name and ds_id:
         existing_ds_id = str(ds_id)
+        with self._cache_lock:
+          self._dataset_id_by_name[name] = existing_ds_id
         break
     
     # 如果找到同名数据集且需要删除，先删除它（包括所有变体）
     if delete_existing:
-      import re
       # 删除所有同名变体（name, name(1), name(2), name(3) 等）
+      variant_re = _name_variant_re(name)
       to_delete = []
       for ds in all_datasets:
         ds_name = ds.get("name") or ds.get("dataset_name")
         ds_id = ds.get("id") or ds.get("dataset_id") or ds.get("_id")
         # 检查是否是 name 或其变体（name(1), name(2) 等）
-        if ds_name == name:
-          if ds_id:
-            to_delete.append((ds_id, ds_name))
-        elif ds_name.startswith(name + "(") and ds_name.endswith(")"):
-          # 验证括号内是数字
-          match = re.match(rf"^{re.escape(name)}\((\d+)\)$", ds_name)
-          if match and ds_id:
-            to_delete.append((ds_id, ds_name))
+        if ds_id and ds_name and variant_re.match(ds_name):
+          to_delete.append((ds_id, ds_name))
       
       # 批量删除所有同名变体
       if to_delete:
+        with self._cache_lock:
+          for _, ds_name in to_delete:
+            self._dataset_id_by_name.pop(ds_name, None)
         delete_ids = [ds_id for ds_id, _ in to_delete]
         try:
           # 使用批量删除 API
           url = f"{self.api_url}/api/v1/datasets"
           payload = {"ids": delete_ids}
-          resp = requests.delete(url, headers=self.headers_json, json=payload, timeout=60)
+          resp = self.session.delete(url, json=payload, timeout=60)
           resp.raise_for_status()
           result = resp.json()
           if isinstance(result, dict) and result.get("code") not in (None, 0):
             raise RuntimeError(f"批量删除数据集失败: {result}")
+          self._invalidate_datasets()
           print(f"[INFO] 已删除 {len(to_delete)} 个同名数据集变体: {[ds_name for _, ds_name in to_delete]}")
-          # 等待一下，确保删除操作完成并让数据库更新
-          time.sleep(2)
           existing_ds_id = None
-          
-          # 验证删除是否成功
-          remaining_datasets = self.list_datasets()
-          remaining_names = {ds.get("name") or ds.get("dataset_name") for ds in remaining_datasets}
-          deleted_names = {ds_name for _, ds_name in to_delete}
-          still_exist = remaining_names & deleted_names
-          if still_exist:
-            print(f"[WARN] 仍有 {len(still_exist)} 个数据集未完全删除: {list(still_exist)}")
         except Exception as e:
           print(f"[WARN] 批量删除同名数据集失败: {e}，尝试逐个删除...")
           # 回退到逐个删除
           for ds_id, ds_name in to_delete:
             try:
               self._delete_json(f"/api/v1/datasets/{ds_id}")
+              self._invalidate_datasets()
               print(f"[INFO] 已删除数据集: {ds_name} ({ds_id})")
-              time.sleep(0.5)
             except Exception as e2:
               print(f"[WARN] 删除数据集失败 {ds_name}: {e2}")
 
+        # 验证删除是否成功：RagFlow 一反映删除就继续，而不是固定等待
+        deleted_names = {ds_name for _, ds_name in to_delete}
+        still_exist: set = set()
+
+        def _deleted() -> bool:
+          self._invalidate_datasets()
+          remaining_names = {ds.get("name") or ds.get("dataset_name") for ds in self.list_datasets()}
+          still_exist.clear()
+          still_exist.update(remaining_names & deleted_names)
+          return not still_exist
+
+        # 验证只是检查，列出数据集失败时仅告警，不中断导入
+        try:
+          if not self._wait_until(_deleted):
+            print(f"[WARN] 仍有 {len(still_exist)} 个数据集未完全删除: {list(still_exist)}")
+        except Exception as e:
+          print(f"[WARN] 验证数据集删除结果失败: {e}")
+
     # 如果找到同名数据集且不需要删除，直接返回
     if existing_ds_id:
       return existing_ds_id
@@ -207,98 +395,143 @@ class RagFlowImporter:
       ds_id = None
 
     if not ds_id:
+      self._invalidate_datasets()
       raise RuntimeError(f"无法从创建数据集响应中获取 dataset_id: {created}")
+
+    # 新数据集直接登记到缓存，后续调用无需重新拉取列表
+    with self._cache_lock:
+      self._dataset_id_by_name[name] = str(ds_id)
+      if self._datasets_cache is not None:
+        self._datasets_cache = self._datasets_cache + [{"id": str(ds_id), "name": name}]
     return str(ds_id)
 
-  # ---- File & document management -----------------------------------------
+  # ---- Direct database cleanup --------------------------------------------
 
-  def upload_file(self, file_path: Path, expected_doc_name: str | None = None, dataset_id: str | None = None) -> str:
-    """
-    Upload a local file to RagFlow file system, return file_id.
-    
-    Args:
-        file_path: Path to the file to upload
-        expected_doc_name: Expected document name (without .txt). If provided, will delete any existing documents with this name or variants before uploading.
-        dataset_id: Dataset ID. Required if expected_doc_name is provided.
+  def _get_db_pool(self):
+    """懒加载共享的 psycopg2 连接池，所有上传线程复用同一批数据库连接。"""
+    with self._cache_lock:
+      if self._db_pool is None:
+        from psycopg2.pool import ThreadedConnectionPool
+        self._db_pool = ThreadedConnectionPool(1, DB_POOL_MAX_CONN, **RAGFLOW_DB_PARAMS)
+      return self._db_pool
+
+  def hard_delete_variants(self, targets: List[Tuple[str, str]]) -> None:
+    """从 RagFlow 数据库中一次性硬删除所有目标的同名文档/文件变体（包括所有状态）。
+
+    targets: [(dataset_id, base_name), ...]，base_name 不含 .txt；会删除 base_name.txt
+    以及 base_name(N).txt。所有目标共用一个连接、一次查询和一次提交。
     """
-    # 如果提供了预期文档名称，先彻底删除所有同名文档和文件（包括所有状态）
-    if expected_doc_name and dataset_id:
-      import psycopg2
+    if not targets:
+      return
+    bases_by_kb: Dict[str, set] = defaultdict(set)
+    for ds_id, base_name in targets:
+      bases_by_kb[ds_id].add(base_name)
+    file_names = {f"{base_name}.txt" for _, base_name in targets}
+    like_patterns = sorted(
+      {_escape_like(base_name) + suffix for _, base_name in targets for suffix in (".txt", "(%).txt")}
+    )
+
+    try:
       from psycopg2.extras import RealDictCursor
+
+      pool = self._get_db_pool()
+      db_conn = pool.getconn()
       try:
-        db_conn = psycopg2.connect(
-          host="localhost", port=5432, database="zeroerr_meta",
-          user="zeroerr", password="zero0000",
-          options="-c search_path=ragflow"
-        )
         with db_conn.cursor(cursor_factory=RealDictCursor) as db_cur:
-          import re
-          
           # 1. 删除所有同名文档变体（包括所有状态）
-          db_cur.execute("""
-            SELECT id, name FROM document
-            WHERE kb_id = %s AND (
-              name = %s OR
-              name LIKE %s
-            )
-          """, (dataset_id, expected_doc_name + ".txt", expected_doc_name + "(%).txt"))
-          db_docs = db_cur.fetchall()
+          db_cur.execute(
+            "SELECT id, kb_id, name FROM document WHERE kb_id = ANY(%s) AND name LIKE ANY(%s)",
+            (list(bases_by_kb), like_patterns),
+          )
           doc_ids_to_delete = []
-          for db_doc in db_docs:
+          touched_kbs = set()
+          for db_doc in db_cur.fetchall():
             doc_name = db_doc["name"]
             doc_base = doc_name[:-4] if doc_name.endswith(".txt") else doc_name
-            if doc_base == expected_doc_name:
+            bases = bases_by_kb.get(db_doc["kb_id"], ())
+            variant = _VARIANT_SUFFIX_RE.match(doc_base)
+            if doc_base in bases or (variant and variant.group(1) in bases):
               doc_ids_to_delete.append(db_doc["id"])
-            elif doc_base.startswith(expected_doc_name + "(") and doc_base.endswith(")"):
-              match = re.match(rf"^{re.escape(expected_doc_name)}\((\d+)\)$", doc_base)
-              if match:
-                doc_ids_to_delete.append(db_doc["id"])
-          
+              touched_kbs.add(db_doc["kb_id"])
+
           if doc_ids_to_delete:
-            # 先删除 file2document 关联
+            # 先删除 file2document 关联，再删除文档
             db_cur.execute("DELETE FROM file2document WHERE document_id = ANY(%s)", (doc_ids_to_delete,))
-            # 再删除文档
             db_cur.execute("DELETE FROM document WHERE id = ANY(%s)", (doc_ids_to_delete,))
             print(f"[INFO] 从数据库硬删除 {len(doc_ids_to_delete)} 个同名文档变体（包括所有状态）")
-          
+
           # 2. 删除所有同名文件变体（File 表，避免文件上传时产生变体）
-          expected_file_name = file_path.name  # 例如: "eCoder 用户手册__eCoder编码器用户手册V2.4__13.txt"
-          db_cur.execute("""
-            SELECT id, name FROM file
-            WHERE name = %s OR name LIKE %s
-          """, (expected_file_name, expected_file_name.replace(".txt", "(%).txt")))
-          db_files = db_cur.fetchall()
+          db_cur.execute("SELECT id, name FROM file WHERE name LIKE ANY(%s)", (like_patterns,))
           file_ids_to_delete = []
-          for db_file in db_files:
+          for db_file in db_cur.fetchall():
             file_name = db_file["name"]
-            if file_name == expected_file_name:
+            variant = _VARIANT_SUFFIX_RE.match(file_name[:-4]) if file_name.endswith(".txt") else None
+            if file_name in file_names or (variant and f"{variant.group(1)}.txt" in file_names):
               file_ids_to_delete.append(db_file["id"])
-            elif file_name.startswith(expected_file_name.replace(".txt", "(")) and file_name.endswith(").txt"):
-              file_base = file_name.rsplit("(", 1)[0] if "(" in file_name else file_name
-              if file_base == expected_file_name.replace(".txt", ""):
-                match = re.match(rf"^{re.escape(expected_file_name.replace('.txt', ''))}\((\d+)\)\.txt$", file_name)
-                if match:
-                  file_ids_to_delete.append(db_file["id"])
-          
+
           if file_ids_to_delete:
-            # 先删除 file2document 关联
+            # 先删除 file2document 关联，再删除文件
             db_cur.execute("DELETE FROM file2document WHERE file_id = ANY(%s)", (file_ids_to_delete,))
-            # 再删除文件
             db_cur.execute("DELETE FROM file WHERE id = ANY(%s)", (file_ids_to_delete,))
             print(f"[INFO] 从数据库硬删除 {len(file_ids_to_delete)} 个同名文件变体（包括所有状态）")
-          
-          if doc_ids_to_delete or file_ids_to_delete:
-            db_conn.commit()
-            import time
-            time.sleep(0.5)  # 等待数据库更新
-        db_conn.close()
-      except Exception as e:
-        print(f"[WARN] 数据库硬删除失败: {e}，继续上传文件")
-    
-    url = f"{self.api_url}/api/v1/file/upload"
-    headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        if doc_ids_to_delete or file_ids_to_delete:
+          db_conn.commit()
+          for kb_id in touched_kbs:
+            self._invalidate_documents(kb_id)
+        else:
+          db_conn.rollback()
+      finally:
+        pool.putconn(db_conn)
+    except Exception as e:
+      print(f"[WARN] 数据库硬删除失败: {e}，继续上传文件")
+
+  def close(self) -> None:
+    """释放 HTTP 会话和数据库连接池。"""
+    self.session.close()
+    if self._db_pool is not None:
+      self._db_pool.closeall()
+      self._db_pool = None
+
+  # ---- File & document management -----------------------------------------
+
+  def _post_file(self, url: str, file_path: Path) -> requests.Response:
+    with file_path.open("rb") as f:
+      if MultipartEncoder is not None:
+        # 请求体从磁盘分块读取，不会先把整个文件读进内存
+        encoder = MultipartEncoder(fields={"file": (file_path.name, f, "text/plain")})
+        return self.session.post(url, data=encoder, headers={"Content-Type": encoder.content_type}, timeout=120)
+      return self.session.post(url, files={"file": (file_path.name, f)}, timeout=120)
+
+  def _post_file_gzip(self, url: str, file_path: Path) -> requests.Response | None:
+    """以 Content-Encoding: gzip 上传；服务端不接受时记住结果并返回 None，由调用方改用普通上传。"""
     with file_path.open("rb") as f:
-      resp = requests.post(url, headers=headers, files={"file": (file_path.name, f)}, timeout=120)
+      prepared = self.session.prepare_request(
+        requests.Request("POST", url, files={"file": (file_path.name, f, "text/plain")})
+      )
+    prepared.body = gzip.compress(prepared.body, compresslevel=6)
+    prepared.headers["Content-Encoding"] = "gzip"
+    prepared.headers["Content-Length"] = str(len(prepared.body))
+    resp = self.session.send(prepared, timeout=120)
+    if resp.status_code in (400, 411, 415):
+      with self._cache_lock:
+        if not self._gzip_rejected:
+          print(f"[WARN] RagFlow 不接受 gzip 请求体 (HTTP {resp.status_code})，改用未压缩上传")
+        self._gzip_rejected = True
+      return None
+    return resp
+
+  def upload_file(self, file_path: Path) -> str:
+    """Upload a local file to RagFlow file system, return file_id.
+
+    同名文档/文件变体的清理由 hard_delete_variants() 和 ensure_no_variants() 统一完成。
+    """
+    url = f"{self.api_url}/api/v1/file/upload"
+    resp = None
+    if UPLOAD_GZIP and not self._gzip_rejected:
+      resp = self._post_file_gzip(url, file_path)
+    if resp is None:
+      resp = self._post_file(url, file_path)
     resp.raise_for_status()
     data = resp.json()
     # API 返回结构可能有多种形式：
@@ -327,16 +560,23 @@ class RagFlowImporter:
     return str(file_id)
 
   def list_documents(self, dataset_id: str) -> List[Dict]:
-    """List all documents in a dataset."""
+    """List all documents in a dataset (cached until the dataset's documents change)."""
+    with self._cache_lock:
+      cached = self._docs_cache.get(dataset_id)
+    if cached is not None:
+      return cached
     data = self._get_json(f"/api/v1/datasets/{dataset_id}/documents", params={"page": 1, "page_size": 200})
+    docs: List[Dict] = []
     if isinstance(data, dict):
       # 返回结构可能是 {"code": 0, "data": {"docs": [...]}} 或 {"data": [...]}
       inner = data.get("data") or {}
       if isinstance(inner, dict) and "docs" in inner:
-        return inner["docs"]
+        docs = inner["docs"]
       elif isinstance(inner, list):
-        return inner
-    return []
+        docs = inner
+    with self._cache_lock:
+      self._docs_cache[dataset_id] = docs
+    return docs
 
   def delete_document(self, dataset_id: str, document_id: str | List[str]) -> None:
     """Delete a document (or multiple documents) from a dataset."""
@@ -346,134 +586,237 @@ class RagFlowImporter:
       payload = {"ids": [document_id]}
     else:
       payload = {"ids": document_id}
-    resp = requests.delete(url, headers=self.headers_json, json=payload, timeout=60)
-    resp.raise_for_status()
-    result = resp.json()
+    try:
+      resp = self.session.delete(url, json=payload, timeout=60)
+      resp.raise_for_status()
+      result = resp.json()
+    finally:
+      self._invalidate_documents(dataset_id)
     if isinstance(result, dict) and result.get("code") not in (None, 0):
       raise RuntimeError(f"删除文档失败: {result}")
 
-  def convert_files_to_documents(self, file_ids: List[str], dataset_ids: List[str], expected_doc_name: str | None = None) -> List[Dict]:
+  def index_documents(self, dataset_id: str) -> Dict[str, List[str]]:
+    """列出一次数据集中的文档，建立 {base_name: [document_id, ...]} 索引。
+
+    base_name 去掉 .txt；"name(N)" 形式的变体同时登记在 name 下，
+    这样按预期名称取一次即可拿到它的所有同名变体。
     """
-    Call /api/v1/file/convert to link files to datasets and create documents.
-    
-    Args:
-        file_ids: List of file IDs to convert
-        dataset_ids: List of dataset IDs to link to
-        expected_doc_name: Expected document name (without .txt). If provided, will delete any existing documents with this name or variants before converting.
+    index: Dict[str, List[str]] = defaultdict(list)
+    for doc in self.list_documents(dataset_id):
+      doc_name = doc.get("name") or doc.get("document_name")
+      doc_id = doc.get("id") or doc.get("document_id")
+      if not doc_name or not doc_id:
+        continue
+      doc_base = doc_name[:-4] if doc_name.endswith(".txt") else doc_name
+      index[doc_base].append(str(doc_id))
+      variant = _VARIANT_SUFFIX_RE.match(doc_base)
+      if variant:
+        index[variant.group(1)].append(str(doc_id))
+    with self._cache_lock:
+      self._doc_index[dataset_id] = dict(index)
+      self._doc_index_taken[dataset_id] = set()
+    return self._doc_index[dataset_id]
+
+  def take_document_variants(self, dataset_id: str, base_name: str) -> List[str]:
+    """从索引中取出 base_name 及其变体对应的文档 ID（每个 ID 只会被取出一次）。"""
+    with self._cache_lock:
+      indexed = dataset_id in self._doc_index
+    if not indexed:
+      self.index_documents(dataset_id)
+    with self._cache_lock:
+      taken = self._doc_index_taken[dataset_id]
+      ids = [doc_id for doc_id in self._doc_index[dataset_id].pop(base_name, []) if doc_id not in taken]
+      taken.update(ids)
+    return ids
+
+  def ensure_no_variants(self, dataset_id: str, base_name: str) -> None:
+    """上传前删除数据集中 base_name 及其 name(N) 变体的文档，每个文档只调用一次。
+
+    数据库层面的硬删除已由 hard_delete_variants() 对所有文档批量完成，
+    这里只处理索引中剩余的、需要通过 HTTP API 删除的文档。
     """
-    # 如果提供了预期文档名称，先删除所有同名变体
-    if expected_doc_name and dataset_ids:
-      for ds_id in dataset_ids:
-        try:
-          existing_docs = self.list_documents(ds_id)
-          docs_to_delete = []
-          for doc in existing_docs:
-            doc_name = doc.get("name") or doc.get("document_name")
-            if not doc_name:
-              continue
-            doc_base = doc_name[:-4] if doc_name.endswith(".txt") else doc_name
-            # 检查是否是预期名称或其变体
-            if doc_base == expected_doc_name:
-              docs_to_delete.append(doc.get("id") or doc.get("document_id"))
-            elif doc_base.startswith(expected_doc_name + "(") and doc_base.endswith(")"):
-              import re
-              match = re.match(rf"^{re.escape(expected_doc_name)}\((\d+)\)$", doc_base)
-              if match:
-                docs_to_delete.append(doc.get("id") or doc.get("document_id"))
-          
-          if docs_to_delete:
-            try:
-              self.delete_document(ds_id, docs_to_delete)
-              import time
-              time.sleep(1.0)  # 等待删除完成
-            except Exception as e:
-              print(f"[WARN] 删除同名文档失败: {e}")
-        except Exception as e:
-          print(f"[WARN] 检查同名文档失败: {e}")
-    
+    delete_ids = self.take_document_variants(dataset_id, base_name)
+    if not delete_ids:
+      return
+    try:
+      self.delete_document(dataset_id, delete_ids)
+      print(f"[INFO] 已删除 {len(delete_ids)} 个同名文档变体: {base_name} (dataset: {dataset_id})")
+    except Exception as e:
+      print(f"[WARN] 删除同名文档变体失败 {base_name}: {e}")
+
+  def convert_files_to_documents(self, file_ids: List[str], dataset_ids: List[str]) -> List[Dict]:
+    """Call /api/v1/file/convert to link files to datasets and create documents."""
     payload = {"file_ids": file_ids, "kb_ids": dataset_ids}
-    data = self._post_json("/api/v1/file/convert", payload)
+    try:
+      data = self._post_json("/api/v1/file/convert", payload)
+    finally:
+      for ds_id in dataset_ids:
+        self._invalidate_documents(ds_id)
     # 预期结构: {"code": 0, "data": [{"id": "...", "file_id": "...", "document_id": "..."}]}
     if isinstance(data, dict):
       return data.get("data") or []
     return []
 
-  def add_chunk(
-    self,
-    dataset_id: str,
-    document_id: str,
-    content: str,
-    important_keywords: List[str] | None = None,
-    questions: List[str] | None = None,
-  ) -> Dict:
-    """Call /api/v1/datasets/{dataset_id}/documents/{document_id}/chunks to add a chunk."""
-    path = f"/api/v1/datasets/{dataset_id}/documents/{document_id}/chunks"
-    payload: Dict[str, Any] = {"content": content}
-    if important_keywords:
-      payload["important_keywords"] = important_keywords
-    if questions:
-      payload["questions"] = questions
-    data = self._post_json(path, payload)
-    # 预期结构：{"code": 0, "data": {...}} 或直接返回 chunk 对象
-    if isinstance(data, dict) and data.get("code") not in (None, 0):
-      raise RuntimeError(f"创建 chunk 失败: {data}")
-    return data
+
+# 构建临时文档时同时保持打开的文件句柄上限，超出后关闭最久未写入的文件
+MAX_OPEN_DOC_FILES = 128
+# 每个临时文档的写缓冲区大小
+DOC_WRITE_BUFFER = 1 << 16
+_PART_SEPARATOR = b"\n\n"
+
+
+def _temp_doc_path(tmp_root: Path, ds_name: str, doc_name: str) -> Path:
+  # 构造相对安全、长度可控的文件名：
+  # - 替换斜杠
+  # - 截断过长部分
+  # - 追加短哈希防止冲突
+  safe_ds = ds_name.replace("/", "_")
+  safe_doc = doc_name.replace("/", "_")
+  base_name = f"{safe_ds}__{safe_doc}"
+  if len(base_name) > 120:
+    digest = hashlib.blake2b(base_name.encode("utf-8"), digest_size=4).hexdigest()
+    safe_ds_short = safe_ds[:40]
+    safe_doc_short = safe_doc[:40]
+    base_name = f"{safe_ds_short}__{safe_doc_short}__{digest}"
+  return tmp_root / f"{base_name}.txt"
 
 
 def build_temp_docs_from_segments(
-  segments: List[SegmentRow],
+  csv_path: Path,
   tmp_root: Path,
 ) -> Dict[Tuple[str, str], Path]:
-  """Group segments by (dataset_name, document_name) and build temp txt files."""
-  grouped: Dict[Tuple[str, str], List[SegmentRow]] = defaultdict(list)
-  for row in segments:
-    if not row.dataset_name or not row.document_name or not row.content:
-      continue
-    grouped[(row.dataset_name, row.document_name)].append(row)
+  """Stream segments into one temp txt file per (dataset_name, document_name).
 
+  段落按到达顺序直接追加写入对应文件，不在内存中聚合整表。只有 segment_index
+  非递增的文档才会在第二遍中重新读取 CSV、排序后重写。
+  """
   tmp_root.mkdir(parents=True, exist_ok=True)
   doc_files: Dict[Tuple[str, str], Path] = {}
+  last_index: Dict[Tuple[str, str], int] = {}
+  unsorted_docs: set = set()
+  open_files: "OrderedDict[Tuple[str, str], BinaryIO]" = OrderedDict()
 
-  for (ds_name, doc_name), rows in grouped.items():
-    # 按 segment_index 排序，拼成一个大文本
-    rows_sorted = sorted(rows, key=lambda r: r.segment_index)
-    parts = [r.content for r in rows_sorted if r.content]
-    text = "\n\n".join(parts)
-    if not text.strip():
-      continue
-
-    # 构造相对安全、长度可控的文件名：
-    # - 替换斜杠
-    # - 截断过长部分
-    # - 追加短哈希防止冲突
-    safe_ds = ds_name.replace("/", "_")
-    safe_doc = doc_name.replace("/", "_")
-    base_name = f"{safe_ds}__{safe_doc}"
-    if len(base_name) > 120:
-      digest = hashlib.sha1(base_name.encode("utf-8")).hexdigest()[:8]
-      safe_ds_short = safe_ds[:40]
-      safe_doc_short = safe_doc[:40]
-      base_name = f"{safe_ds_short}__{safe_doc_short}__{digest}"
-
-    file_path = tmp_root / f"{base_name}.txt"
-    file_path.write_text(text, encoding="utf-8")
-    doc_files[(ds_name, doc_name)] = file_path
+  try:
+    for row in iter_segments(csv_path):
+      key = (row.dataset_name, row.document_name)
+      f = open_files.get(key)
+      if f is None:
+        if len(open_files) >= MAX_OPEN_DOC_FILES:
+          _, oldest = open_files.popitem(last=False)
+          oldest.close()
+        if key in doc_files:
+          f = doc_files[key].open("ab", buffering=DOC_WRITE_BUFFER)
+        else:
+          doc_files[key] = _temp_doc_path(tmp_root, *key)
+          f = doc_files[key].open("wb", buffering=DOC_WRITE_BUFFER)
+        open_files[key] = f
+      else:
+        open_files.move_to_end(key)
+
+      if key in last_index:
+        if row.segment_index < last_index[key]:
+          unsorted_docs.add(key)
+        f.write(_PART_SEPARATOR)
+      last_index[key] = row.segment_index
+      # 逐段编码后直接写入缓冲区，不会为整篇文档生成一份完整的 str/bytes
+      f.write(row.content.encode("utf-8"))
+  finally:
+    for f in open_files.values():
+      f.close()
+
+  if unsorted_docs:
+    # 仅为乱序文档再读一遍 CSV，按 segment_index 稳定排序后重写
+    pending: Dict[Tuple[str, str], List[Tuple[int, str]]] = defaultdict(list)
+    for row in iter_segments(csv_path):
+      key = (row.dataset_name, row.document_name)
+      if key in unsorted_docs:
+        pending[key].append((row.segment_index, row.content))
+    for key, parts in pending.items():
+      parts.sort(key=lambda p: p[0])
+      with doc_files[key].open("wb", buffering=DOC_WRITE_BUFFER) as f:
+        for i, (_, content) in enumerate(parts):
+          if i:
+            f.write(_PART_SEPARATOR)
+          f.write(content.encode("utf-8"))
 
   return doc_files
 
 
+def _write_datasets_json(datasets_json_path: Path, data: Dict) -> None:
+  """以 2 空格缩进、保留中文的格式写入 datasets.json；安装了 orjson 时用它直接输出 UTF-8 字节。"""
+  if orjson is not None:
+    datasets_json_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+  else:
+    datasets_json_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _fetch_all_docs(session: requests.Session, api_url: str, ds_id: str, ds_name: str) -> Dict[str, str]:
+  """分页获取一个数据集的全部文档，返回 {doc_name: doc_id}。"""
+  docs_map = {}
+  docs_page = 1
+  while True:
+    try:
+      docs_response = session.get(
+        f"{api_url}/api/v1/datasets/{ds_id}/documents",
+        params={"page": docs_page, "page_size": 200},
+        timeout=30
+      )
+      docs_response.raise_for_status()
+      docs_data = docs_response.json()
+      
+      # RagFlow API 返回格式: {"code": 0, "data": {"docs": [...], "total": ...}}
+      docs_list = []
+      if isinstance(docs_data, dict) and docs_data.get("code") == 0:
+        data_obj = docs_data.get("data", {})
+        if isinstance(data_obj, dict):
+          docs_list = data_obj.get("docs", []) or data_obj.get("data", [])
+        elif isinstance(data_obj, list):
+          docs_list = data_obj
+      elif isinstance(docs_data, list):
+        docs_list = docs_data
+      
+      if not docs_list:
+        break
+      
+      for doc in docs_list:
+        doc_id = doc.get("id") or doc.get("document_id")
+        doc_name = doc.get("name") or doc.get("document_name") or "Unknown"
+        if doc_id:
+          docs_map[doc_name] = doc_id
+      
+      # 检查是否还有更多页
+      if isinstance(docs_data, dict) and docs_data.get("code") == 0:
+        data_obj = docs_data.get("data", {})
+        if isinstance(data_obj, dict):
+          total = data_obj.get("total", 0)
+          if docs_page * 200 >= total:
+            break
+      else:
+        break
+      docs_page += 1
+    except Exception as e:
+      print(f"[WARN] 获取数据集 {ds_name} ({ds_id}) 的文档列表失败: {e}")
+      break
+  return docs_map
+
+
 def sync_datasets_json_from_api(
   datasets_json_path: Path,
   api_url: str,
   api_key: str,
+  session: requests.Session | None = None,
 ) -> Dict[str, Dict[str, any]]:
   """
   从 RagFlow API 同步所有当前 API key 有权限的数据集和文档到 datasets.json。
   
+  session: 可复用的 Session（例如 RagFlowImporter.session），为空时新建一个
+  
   返回: 同步后的数据集映射
   """
-  headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+  if session is None:
+    session = build_session(api_key)
   datasets_result = {}
+  api_dataset_list: List[Tuple[str, str]] = []
   page = 1
   page_size = 100
   
@@ -482,9 +825,8 @@ def sync_datasets_json_from_api(
   # 1. 获取所有数据集
   while True:
     try:
-      response = requests.get(
+      response = session.get(
         f"{api_url}/api/v1/datasets",
-        headers=headers,
         params={"page": page, "page_size": page_size},
         timeout=30
       )
@@ -498,66 +840,11 @@ def sync_datasets_json_from_api(
       if not api_datasets:
         break
       
-      # 2. 对每个数据集，获取其文档列表
       for ds in api_datasets:
         ds_id = ds.get("id") or ds.get("dataset_id") or ds.get("_id")
         ds_name = ds.get("name") or ds.get("dataset_name") or "Unknown"
-        
-        if not ds_id:
-          continue
-        
-        # 获取文档列表
-        docs_map = {}
-        docs_page = 1
-        while True:
-          try:
-            docs_response = requests.get(
-              f"{api_url}/api/v1/datasets/{ds_id}/documents",
-              headers=headers,
-              params={"page": docs_page, "page_size": 200},
-              timeout=30
-            )
-            docs_response.raise_for_status()
-            docs_data = docs_response.json()
-            
-            # RagFlow API 返回格式: {"code": 0, "data": {"docs": [...], "total": ...}}
-            docs_list = []
-            if isinstance(docs_data, dict) and docs_data.get("code") == 0:
-              data_obj = docs_data.get("data", {})
-              if isinstance(data_obj, dict):
-                docs_list = data_obj.get("docs", []) or data_obj.get("data", [])
-              elif isinstance(data_obj, list):
-                docs_list = data_obj
-            elif isinstance(docs_data, list):
-              docs_list = docs_data
-            
-            if not docs_list:
-              break
-            
-            for doc in docs_list:
-              doc_id = doc.get("id") or doc.get("document_id")
-              doc_name = doc.get("name") or doc.get("document_name") or "Unknown"
-              if doc_id:
-                docs_map[doc_name] = doc_id
-            
-            # 检查是否还有更多页
-            if isinstance(docs_data, dict) and docs_data.get("code") == 0:
-              data_obj = docs_data.get("data", {})
-              if isinstance(data_obj, dict):
-                total = data_obj.get("total", 0)
-                if docs_page * 200 >= total:
-                  break
-            else:
-              break
-            docs_page += 1
-          except Exception as e:
-            print(f"[WARN] 获取数据集 {ds_name} ({ds_id}) 的文档列表失败: {e}")
-            break
-        
-        datasets_result[ds_name] = {
-          "id": ds_id,
-          "documents": docs_map
-        }
+        if ds_id:
+          api_dataset_list.append((ds_id, ds_name))
       
       # 检查是否还有更多页
       total_datasets = data.get("total_datasets", 0) or data.get("total", 0)
@@ -569,11 +856,21 @@ def sync_datasets_json_from_api(
       print(f"[ERROR] 获取数据集列表失败: {e}")
       break
   
+  # 2. 并发获取每个数据集的文档列表；map 按提交顺序返回，结果顺序与串行时一致
+  if api_dataset_list:
+    with ThreadPoolExecutor(max_workers=min(SYNC_WORKERS, len(api_dataset_list))) as executor:
+      docs_maps = executor.map(
+        lambda item: _fetch_all_docs(session, api_url, item[0], item[1]),
+        api_dataset_list,
+      )
+      for (ds_id, ds_name), docs_map in zip(api_dataset_list, docs_maps):
+        datasets_result[ds_name] = {
+          "id": ds_id,
+          "documents": docs_map
+        }
+  
   # 3. 写入 datasets.json
-  datasets_json_path.write_text(
-    json.dumps(datasets_result, ensure_ascii=False, indent=2),
-    encoding="utf-8"
-  )
+  _write_datasets_json(datasets_json_path, datasets_result)
   
   total_docs = sum(len(ds["documents"]) for ds in datasets_result.values())
   print(f"[OK] 已同步 datasets.json: {len(datasets_result)} 个数据集, {total_docs} 个文档")
@@ -586,13 +883,14 @@ def update_datasets_json(
   mapping: Dict[str, Tuple[str, Dict[str, str]]],
   api_url: str,
   api_key: str,
+  session: requests.Session | None = None,
 ) -> None:
   """
   合并新导入的数据集/文档映射到 datasets.json。
   先同步当前 API key 的所有数据集，然后合并新导入的数据。
   """
   # 1. 先同步当前 API key 的所有数据集（删除旧的无权限数据）
-  existing = sync_datasets_json_from_api(datasets_json_path, api_url, api_key)
+  existing = sync_datasets_json_from_api(datasets_json_path, api_url, api_key, session=session)
   
   # 2. 合并新导入的数据
   for theme, (dataset_id, documents) in mapping.items():
@@ -605,10 +903,115 @@ def update_datasets_json(
     existing[theme]["documents"] = docs_map
   
   # 3. 写入更新后的数据
-  datasets_json_path.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
+  _write_datasets_json(datasets_json_path, existing)
   print(f"[OK] 已更新 datasets.json，包含 {len(existing)} 个数据集")
 
 
+def ingest_document(
+  importer: RagFlowImporter,
+  ds_name: str,
+  doc_name: str,
+  file_path: Path,
+  ds_id: str,
+) -> Tuple[str, str, str]:
+  """清理同名文档变体 -> 上传文件 -> 转换为文档，返回 (dataset_name, document_name, document_id)。
+
+  每个文档的处理互相独立，可在线程池中并发执行。
+  """
+  # 1) 删除同名文档（包括所有变体：doc_name, doc_name(1), doc_name(2) 等）
+  # RagFlow 中的文档名称为 "数据集名__文档名.txt" 或 "数据集名__文档名(数字).txt"，
+  # 与 file_path 的文件名一致
+  expected_base_name = file_path.stem  # 例如: "eCoder 用户手册__eCoder编码器用户手册V2.4__13"
+  importer.ensure_no_variants(ds_id, expected_base_name)
+
+  # 2) 上传文件（数据库中的同名文档/文件变体已在 main() 中统一硬删除）
+  file_id = importer.upload_file(file_path)
+
+  # 3) 转换为文档并挂到 dataset
+  convert_results = importer.convert_files_to_documents([file_id], [ds_id])
+  doc_id = None
+  if convert_results:
+    one = convert_results[0]
+    doc_id = one.get("document_id")
+  if not doc_id:
+    # 有些版本可能直接在 convert 之后通过列表接口获取文档 ID，这里简化为必需存在
+    raise RuntimeError(f"无法从 file/convert 响应中获取 document_id: {convert_results}")
+
+  return ds_name, doc_name, doc_id
+
+
+async def _post_chunk(client: httpx.AsyncClient, dataset_id: str, document_id: str, payload: Dict) -> None:
+  resp = await client.post(f"/api/v1/datasets/{dataset_id}/documents/{document_id}/chunks", json=payload)
+  resp.raise_for_status()
+  data = resp.json()
+  # 预期结构：{"code": 0, "data": {...}} 或直接返回 chunk 对象
+  if isinstance(data, dict) and data.get("code") not in (None, 0):
+    raise RuntimeError(f"创建 chunk 失败: {data}")
+
+
+async def _collect_done(done: set) -> None:
+  """读取一批已完成任务的结果（每个任务的异常都会被取走），有失败时抛出第一个错误"""
+  results = await asyncio.gather(*done, return_exceptions=True)
+  for result in results:
+    if isinstance(result, BaseException):
+      raise result
+
+
+async def write_chunks_async(
+  api_url: str,
+  api_key: str,
+  seg_csv: Path,
+  dataset_ids: Dict[str, str],
+  doc_ids: Dict[Tuple[str, str], str],
+) -> int:
+  """流式读取 segments.csv，用一个 AsyncClient 并发写入所有 chunk，返回写入数量。
+
+  RagFlow 的 chunks 接口一次只接受一个 chunk。这里跨文档保持最多 CHUNK_CONCURRENCY
+  个请求在途，而不是逐个等待 RTT；任一 chunk 失败时取消其余请求并抛出异常。
+  安装了 h2 时使用 HTTP/2 多路复用。
+  """
+  transport = httpx.AsyncHTTPTransport(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(max_connections=CHUNK_CONCURRENCY, max_keepalive_connections=CHUNK_CONCURRENCY),
+    retries=3,
+  )
+  written = 0
+  pending: set = set()
+  async with httpx.AsyncClient(
+    base_url=api_url,
+    headers={"Authorization": f"Bearer {api_key}"},
+    transport=transport,
+    timeout=60,
+  ) as client:
+    try:
+      for row in iter_segments(seg_csv):
+        ds_id = dataset_ids.get(row.dataset_name)
+        doc_id = doc_ids.get((row.dataset_name, row.document_name))
+        if not ds_id or not doc_id:
+          # 如果找不到对应的文档，跳过
+          continue
+        if len(pending) >= CHUNK_CONCURRENCY:
+          done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+          await _collect_done(done)
+          written += len(done)
+        # 构造 important_keywords，便于后续在检索结果中解析章节信息：
+        # [0] 知识库名称 (dataset)，[1] 大章标题/编号 (document_name)，[2] 再次附加一份，方便使用 ChapterMatcher 提取章节号
+        keywords = [row.dataset_name, row.document_name, row.document_name]
+        payload = {"content": row.content, "important_keywords": keywords}
+        pending.add(asyncio.create_task(_post_chunk(client, ds_id, doc_id, payload)))
+
+      if pending:
+        done, pending = await asyncio.wait(pending)
+        await _collect_done(done)
+        written += len(done)
+    finally:
+      # 出错时取消仍在途的请求，并在关闭 client 之前等它们真正结束
+      for task in pending:
+        task.cancel()
+      await asyncio.gather(*pending, return_exceptions=True)
+  return written
+
+
 def main() -> None:
   load_dotenv()
 
@@ -622,167 +1025,83 @@ def main() -> None:
   if not seg_csv.exists():
     raise FileNotFoundError(f"未找到 segments.csv: {seg_csv}")
 
-  segments = load_segments(seg_csv)
-  if not segments:
+  if next(iter_segments(seg_csv), None) is None:
     raise RuntimeError("segments.csv 中没有有效数据")
 
   tmp_root = base_dir / "data" / "ragflow_import" / "tmp_docs"
-  doc_files = build_temp_docs_from_segments(segments, tmp_root)
+  doc_files = build_temp_docs_from_segments(seg_csv, tmp_root)
   if not doc_files:
     raise RuntimeError("未能从 segments.csv 生成任何临时文档")
 
   importer = RagFlowImporter(api_url, api_key)
-  
-  # ========== 步骤 1: 删除 ==========
-  # 同步 datasets.json，删除当前 API key 无权限的旧数据集
-  datasets_json_path = base_dir / "datasets.json"
-  print(f"\n{'='*80}")
-  print("[步骤 1/2] 删除：同步 datasets.json，清理无权限的旧数据集")
-  print(f"{'='*80}")
-  sync_datasets_json_from_api(datasets_json_path, api_url, api_key)
-
-  # ========== 步骤 2: 上传 ==========
-  print(f"\n{'='*80}")
-  print("[步骤 2/2] 上传：导入新数据到 RagFlow")
-  print(f"{'='*80}")
-
-  # dataset_name -> dataset_id
-  dataset_ids: Dict[str, str] = {}
-  # theme -> (dataset_id, {doc_name: doc_id})  # 供 datasets.json 使用
-  theme_mapping: Dict[str, Tuple[str, Dict[str, str]]] = {}
-  # (dataset_name, document_name) -> document_id  # 供后续写 chunk 使用
-  doc_ids: Dict[Tuple[str, str], str] = {}
-
-  for (ds_name, doc_name), file_path in doc_files.items():
-    # 1) 找或建 dataset（如果已存在同名数据集，先删除它以避免名称冲突）
-    if ds_name not in dataset_ids:
-      ds_id = importer.find_or_create_dataset(ds_name, delete_existing=True)
-      dataset_ids[ds_name] = ds_id
-    else:
-      ds_id = dataset_ids[ds_name]
-
-    # 1.5) 检查并删除同名文档（包括所有变体：doc_name, doc_name(1), doc_name(2) 等）
-    import time
-    import re
-    
-    # 构建预期的文档名称格式（RagFlow 中可能是 "数据集名__文档名.txt" 或 "数据集名__文档名(数字).txt"）
-    # 从 file_path 提取文件名（不含路径和扩展名）
-    expected_base_name = file_path.stem  # 例如: "eCoder 用户手册__eCoder编码器用户手册V2.4__13"
-    
-    # 多次尝试删除，确保彻底清理
-    max_retries = 3
-    for attempt in range(max_retries):
-      existing_docs = importer.list_documents(ds_id)
-      docs_to_delete = []
-      
-      for doc in existing_docs:
-        doc_name_in_ragflow = doc.get("name") or doc.get("document_name")
-        doc_id_to_delete = doc.get("id") or doc.get("document_id")
-        
-        if not doc_name_in_ragflow or not doc_id_to_delete:
-          continue
-        
-        # 提取文档名称的基础部分（去掉 .txt 扩展名）
-        doc_base = doc_name_in_ragflow
-        if doc_base.endswith(".txt"):
-          doc_base = doc_base[:-4]
-        
-        # 检查是否是预期文档名称或其变体
-        # 1. 精确匹配
-        if doc_base == expected_base_name:
-          docs_to_delete.append((doc_id_to_delete, doc_name_in_ragflow))
-        # 2. 检查是否是变体（如 expected_base_name(1), expected_base_name(2) 等）
-        elif doc_base.startswith(expected_base_name + "(") and doc_base.endswith(")"):
-          # 验证括号内是数字
-          match = re.match(rf"^{re.escape(expected_base_name)}\((\d+)\)$", doc_base)
-          if match:
-            docs_to_delete.append((doc_id_to_delete, doc_name_in_ragflow))
-      
-      if not docs_to_delete:
-        # 没有需要删除的文档，退出循环
-        break
-      
-      # 批量删除所有同名文档变体
-      delete_ids = [doc_id for doc_id, _ in docs_to_delete]
-      try:
-        # 使用批量删除
-        importer.delete_document(ds_id, delete_ids)
-        print(f"[INFO] [尝试 {attempt + 1}/{max_retries}] 已删除 {len(docs_to_delete)} 个同名文档变体: {[doc_name for _, doc_name in docs_to_delete[:5]]}{'...' if len(docs_to_delete) > 5 else ''} (dataset: {ds_name})")
-        # 等待删除完成并让数据库更新
-        time.sleep(1.0)
-        
-        # 验证删除是否成功（重新查询）
-        remaining_docs = importer.list_documents(ds_id)
-        remaining_names = {doc.get("name") or doc.get("document_name") for doc in remaining_docs}
-        deleted_names = {doc_name for _, doc_name in docs_to_delete}
-        still_exist = remaining_names & deleted_names
-        
-        if still_exist:
-          print(f"[WARN] 仍有 {len(still_exist)} 个文档未完全删除: {list(still_exist)[:3]}...")
-          if attempt < max_retries - 1:
-            time.sleep(1.0)  # 再等待一下
-            continue
+  try:
+    # ========== 步骤 1: 删除 ==========
+    # 同步 datasets.json，删除当前 API key 无权限的旧数据集
+    datasets_json_path = base_dir / "datasets.json"
+    print(f"\n{'='*80}")
+    print("[步骤 1/2] 删除：同步 datasets.json，清理无权限的旧数据集")
+    print(f"{'='*80}")
+    sync_datasets_json_from_api(datasets_json_path, api_url, api_key, session=importer.session)
+
+    # ========== 步骤 2: 上传 ==========
+    print(f"\n{'='*80}")
+    print("[步骤 2/2] 上传：导入新数据到 RagFlow")
+    print(f"{'='*80}")
+
+    # dataset_name -> dataset_id
+    dataset_ids: Dict[str, str] = {}
+    # theme -> (dataset_id, {doc_name: doc_id})  # 供 datasets.json 使用
+    theme_mapping: Dict[str, Tuple[str, Dict[str, str]]] = {}
+    # (dataset_name, document_name) -> document_id  # 供后续写 chunk 使用
+    doc_ids: Dict[Tuple[str, str], str] = {}
+
+    # 1) 先串行找或建所有 dataset（如果已存在同名数据集，先删除它以避免名称冲突），
+    #    避免并发上传时 find_or_create_dataset 出现竞争
+    for ds_name, _ in doc_files:
+      if ds_name not in dataset_ids:
+        dataset_ids[ds_name] = importer.find_or_create_dataset(ds_name, delete_existing=True)
+
+    # 2) 上传前一次性从数据库硬删除所有文档的同名变体（包括所有状态），
+    #    再为每个数据集只列一次文档，建立同名变体索引，供各文档上传前查找删除
+    importer.hard_delete_variants(
+      [(dataset_ids[ds_name], file_path.stem) for (ds_name, _), file_path in doc_files.items()]
+    )
+    for ds_id in set(dataset_ids.values()):
+      importer.index_documents(ds_id)
+
+    # 3) 并发处理每个文档：清理同名变体、上传、转换
+    upload_workers = int(os.getenv("RAGFLOW_UPLOAD_WORKERS", "8"))
+    print(f"[INFO] 并发上传 {len(doc_files)} 个文档，线程数: {upload_workers}")
+    with ThreadPoolExecutor(max_workers=upload_workers) as executor:
+      futures = [
+        executor.submit(ingest_document, importer, ds_name, doc_name, file_path, dataset_ids[ds_name])
+        for (ds_name, doc_name), file_path in doc_files.items()
+      ]
+      # 结果在主线程中合并，无需额外加锁
+      for future in as_completed(futures):
+        ds_name, doc_name, doc_id = future.result()
+        ds_id = dataset_ids[ds_name]
+
+        # 记录到 theme 映射
+        mapping_entry = theme_mapping.get(ds_name)
+        if not mapping_entry:
+          theme_mapping[ds_name] = (ds_id, {doc_name: doc_id})
         else:
-          # 删除成功，退出循环
-          break
-          
-      except Exception as e:
-        print(f"[WARN] 批量删除同名文档失败: {e}，尝试逐个删除...")
-        # 回退到逐个删除
-        for doc_id, doc_name_var in docs_to_delete:
-          try:
-            importer.delete_document(ds_id, doc_id)
-            time.sleep(0.3)
-          except Exception as e2:
-            print(f"[WARN] 删除文档变体失败 {doc_name_var}: {e2}")
-        
-        if attempt < max_retries - 1:
-          time.sleep(1.0)
-          continue
+          _, docs_map = mapping_entry
+          docs_map[doc_name] = doc_id
 
-    # 2) 上传文件（在上传前先删除所有同名文档变体）
-    expected_base_name = file_path.stem  # 例如: "eCoder 用户手册__eCoder编码器用户手册V2.4__13"
-    file_id = importer.upload_file(file_path, expected_doc_name=expected_base_name, dataset_id=ds_id)
-
-    # 3) 转换为文档并挂到 dataset
-    convert_results = importer.convert_files_to_documents([file_id], [ds_id])
-    doc_id = None
-    if convert_results:
-      one = convert_results[0]
-      doc_id = one.get("document_id")
-    if not doc_id:
-      # 有些版本可能直接在 convert 之后通过列表接口获取文档 ID，这里简化为必需存在
-      raise RuntimeError(f"无法从 file/convert 响应中获取 document_id: {convert_results}")
-
-    # 记录到 theme 映射
-    mapping_entry = theme_mapping.get(ds_name)
-    if not mapping_entry:
-      theme_mapping[ds_name] = (ds_id, {doc_name: doc_id})
-    else:
-      _, docs_map = mapping_entry
-      docs_map[doc_name] = doc_id
-
-    # 记录文档 ID
-    doc_ids[(ds_name, doc_name)] = doc_id
-
-  # 4) 使用 chunks API 将 segments.csv 中的每一条内容写入对应文档
-  for row in segments:
-    ds_id = dataset_ids.get(row.dataset_name)
-    doc_id = doc_ids.get((row.dataset_name, row.document_name))
-    if not ds_id or not doc_id:
-      # 如果找不到对应的文档，跳过这一条
-      continue
-    if not row.content:
-      continue
-    # 构造 important_keywords，便于后续在检索结果中解析章节信息：
-    # [0] 知识库名称 (dataset)，[1] 大章标题/编号 (document_name)，[2] 再次附加一份，方便使用 ChapterMatcher 提取章节号
-    keywords = [row.dataset_name, row.document_name, row.document_name]
-    importer.add_chunk(ds_id, doc_id, row.content, important_keywords=keywords)
-
-  # 5) 更新 backend/datasets.json（合并新导入的数据）
-  update_datasets_json(datasets_json_path, theme_mapping, api_url, api_key)
-
-  print(f"[OK] 已导入 {len(doc_files)} 个文档并写入 {len(segments)} 个 chunks 到 RagFlow，并更新 {datasets_json_path}")
+        # 记录文档 ID
+        doc_ids[(ds_name, doc_name)] = doc_id
+
+    # 4) 使用 chunks API 将 segments.csv 中的每一条内容写入对应文档
+    #    重新流式读取 CSV，通过 asyncio 并发提交，内存中只保留在途的请求
+    chunk_count = asyncio.run(write_chunks_async(api_url, api_key, seg_csv, dataset_ids, doc_ids))
+
+    # 5) 更新 backend/datasets.json（合并新导入的数据）
+    update_datasets_json(datasets_json_path, theme_mapping, api_url, api_key, session=importer.session)
+  finally:
+    importer.close()
+  print(f"[OK] 已导入 {len(doc_files)} 个文档并写入 {chunk_count} 个 chunks 到 RagFlow，并更新 {datasets_json_path}")
 
 
 if __name__ == "__main__":
@@ -4,10 +4,88 @@
 """
 import re
 import logging
-from typing import Optional, List
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 预编译的正则，避免每次调用时重新查找/编译
+_CN_NUM = '一二三四五六七八九十'
+_CN_NUM_BIG = '一二三四五六七八九十百千万'
+_RE_ENG_WORD = re.compile(r'\b[A-Za-z]{4,}\b')
+_HAS_ASCII_ALPHA = re.compile(r'[A-Za-z]').search
+_RE_LEADING_NUMERIC = re.compile(r'^(\d+(?:\.\d+)*)')
+_RE_NUM_DOT = re.compile(r'\d+(?:\.\d+)*')
+_CN_NUM_SET = frozenset(_CN_NUM_BIG)
+_RE_CJK_NUM_SEARCH = re.compile(rf'([{_CN_NUM_BIG}\d]+)')
+_RE_CHAPTER_SECTION = re.compile(rf'第[{_CN_NUM}\d]+章第[{_CN_NUM}\d]+节')
+_RE_CHAPTER = re.compile(rf'第[{_CN_NUM}\d]+章[^第]*')
+_RE_SECTION = re.compile(rf'第[{_CN_NUM}\d]+节')
+_RE_CJK_NUM_PUNCT = re.compile(rf'([{_CN_NUM_BIG}\d]+)[、，。]')
+_RE_CHAPTER_ANY = re.compile(rf'(\d+(?:\.\d+)*|第[{_CN_NUM}\d]+章|第[{_CN_NUM}\d]+节|[{_CN_NUM_BIG}\d]+)[、，。]?')
+_RE_CHAP_NUM = re.compile(rf'第([{_CN_NUM}\d]+)章')
+_RE_SEC_NUM = re.compile(rf'第([{_CN_NUM}\d]+)节')
+
+# 把按优先级依次 search 的章/节模式合并成一个正则：公共前缀 "第+数字" 只扫描一次，
+# 再按命名分组（lastgroup）分派
+_RE_EXTRACT_UNION = re.compile(rf'第[{_CN_NUM}\d]+(?:(?P<cs>章第[{_CN_NUM}\d]+节)|(?P<c>章[^第]*)|(?P<s>节))')
+_EXTRACT_ORDER = (('cs', _RE_CHAPTER_SECTION), ('c', _RE_CHAPTER), ('s', _RE_SECTION))
+# normalize_chapter 的顺序是 第X章... > 第X章第Y节 > 第Y节；前者总会先命中，第二项无需单列
+_RE_NORMALIZE_UNION = re.compile(rf'第[{_CN_NUM}\d]+(?:(?P<c>章[^第]*)|(?P<s>节))')
+_NORMALIZE_ORDER = (('c', _RE_CHAPTER), ('s', _RE_SECTION))
+
+
+def _search_by_priority(union: 're.Pattern[str]', order, text: str) -> Optional['re.Match[str]']:
+    """等价于按 order 逐个 search 并返回第一个命中的结果，但通常只需扫描一次。
+
+    union 找到的是最靠前的候选；只有当它不是最高优先级的模式时，才从该位置起
+    补查更高优先级的模式（更靠前的位置已被 union 排除）。
+    """
+    match = union.search(text)
+    if not match:
+        return None
+    for name, pattern in order:
+        if name == match.lastgroup:
+            return match
+        higher = pattern.search(text, match.start())
+        if higher:
+            return higher
+    return match
+
+
+def _build_cn2ar() -> Dict[str, int]:
+    """预先生成 零~九十九 的规范中文写法到数字的映射（十、十一、二十、九十九 ...）"""
+    digits = '零一二三四五六七八九'
+    table = {'百': 100, '千': 1000, '万': 10000}
+    for n in range(100):
+        tens, ones = divmod(n, 10)
+        if tens == 0:
+            text = digits[ones]
+        else:
+            text = ('' if tens == 1 else digits[tens]) + '十' + ('' if ones == 0 else digits[ones])
+        table[text] = n
+    return table
+
+
+_CN2AR = _build_cn2ar()
+
+
+def _is_cjk_numeral(text: str) -> bool:
+    """text 是否全部由中文数字组成（集合判断代替正则；与原 ^...$ 一样容许末尾一个换行）"""
+    if text.endswith('\n'):
+        text = text[:-1]
+    return bool(text) and _CN_NUM_SET.issuperset(text)
+
+# 查表未命中的 "X十Y" 写法（如 一十五）：一次匹配同时取出十位和个位
+_CN_DIGIT = {c: i for i, c in enumerate('一二三四五六七八九', 1)}
+_RE_CN_TEN = re.compile(r'([一二三四五六七八九])?十([一二三四五六七八九])?')
+
+
+# remove_english_text 的英文关键字，按原有优先级排列（区分大小写）
+_ENGLISH_KEYWORDS = ('Chapter', 'Section', 'Part', 'CHAPTER', 'SECTION', 'PART')
+_RE_ENG_KEYWORD = re.compile('|'.join(f'(?P<k{i}>{kw})' for i, kw in enumerate(_ENGLISH_KEYWORDS)))
+_ENG_KEYWORD_ORDER = tuple((f'k{i}', re.compile(kw)) for i, kw in enumerate(_ENGLISH_KEYWORDS))
+
 
 class ChapterMatcher:
     """章节匹配器 - 判断章节层级关系"""
@@ -29,14 +107,15 @@ class ChapterMatcher:
         if not text:
             return text
         
-        english_keywords = ['Chapter', 'Section', 'Part', 'CHAPTER', 'SECTION', 'PART']
-        for keyword in english_keywords:
-            idx = text.find(keyword)
-            if idx != -1:
-                return text[:idx].strip()
+        # 关键字和英文单词都由 ASCII 字母组成；纯中文输入（最常见）直接跳过两次正则搜索
+        if not _HAS_ASCII_ALPHA(text):
+            return text.strip()
         
-        pattern = r'\b[A-Za-z]{4,}\b'
-        match = re.search(pattern, text)
+        keyword = _search_by_priority(_RE_ENG_KEYWORD, _ENG_KEYWORD_ORDER, text)
+        if keyword:
+            return text[:keyword.start()].strip()
+        
+        match = _RE_ENG_WORD.search(text)
         if match:
             chinese_part = text[:match.start()].strip()
             if chinese_part:
@@ -55,6 +134,11 @@ class ChapterMatcher:
         if chinese_num.isdigit():
             return int(chinese_num)
         
+        # 常见写法（零~九十九、百、千、万）直接查表
+        value = _CN2AR.get(chinese_num)
+        if value is not None:
+            return value
+        
         if chinese_num in ChapterMatcher.CHINESE_NUM_MAP:
             return ChapterMatcher.CHINESE_NUM_MAP[chinese_num]
         
@@ -65,6 +149,10 @@ class ChapterMatcher:
             if base in ChapterMatcher.CHINESE_NUM_MAP:
                 return ChapterMatcher.CHINESE_NUM_MAP[base] * 10
         
+        match = _RE_CN_TEN.fullmatch(chinese_num)
+        if match:
+            return _CN_DIGIT.get(match.group(1), 1) * 10 + _CN_DIGIT.get(match.group(2), 0)
+        
         if len(chinese_num) >= 2 and '十' in chinese_num:
             parts = chinese_num.split('十')
             if len(parts) == 2:
@@ -82,141 +170,28 @@ class ChapterMatcher:
         """标准化章节格式，提取纯数字章节编号"""
         if not chapter:
             return ""
-        
-        chapter = str(chapter).strip()
-        chapter = ChapterMatcher.remove_english_text(chapter)
-        chapter = chapter.rstrip('.')
-        
-        pattern = r'^(\d+(?:\.\d+)*)'
-        match = re.match(pattern, chapter)
-        if match:
-            return match.group(1)
-        
-        patterns = [
-            r'第[一二三四五六七八九十\d]+章[^第]*',
-            r'第[一二三四五六七八九十\d]+章第[一二三四五六七八九十\d]+节',
-            r'第[一二三四五六七八九十\d]+节',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, chapter)
-            if match:
-                matched = match.group(0).rstrip('.')
-                matched = ChapterMatcher.remove_english_text(matched)
-                return matched
-        
-        return chapter.rstrip('.')
+        return _normalize_chapter(str(chapter))
     
     @staticmethod
     def extract_chapter_info(text: str) -> Optional[str]:
         """从文本中提取章节信息"""
         if not text:
             return None
-        
-        text_str = str(text).strip()
-        if not text_str:
-            return None
-        
-        text_str = ChapterMatcher.remove_english_text(text_str)
-        
-        # 匹配数字格式
-        numeric_parts = []
-        i = 0
-        while i < len(text_str) and text_str[i].isdigit():
-            num_match = re.match(r'^\d+', text_str[i:])
-            if num_match:
-                num_str = num_match.group(0)
-                numeric_parts.append(num_str)
-                i += len(num_str)
-                
-                if i < len(text_str) and text_str[i] == '.':
-                    if i + 1 < len(text_str) and text_str[i + 1].isdigit():
-                        i += 1
-                        continue
-                    else:
-                        break
-                elif i < len(text_str) and text_str[i] in (' ', '\t', '\n'):
-                    break
-                else:
-                    break
-            else:
-                break
-        
-        if numeric_parts:
-            numeric = '.'.join(numeric_parts)
-            if i < len(text_str) and text_str[i] in ('x', 'X') and numeric.endswith('.0'):
-                numeric = '.'.join(numeric_parts[:-1])
-            return numeric
-        
-        # 匹配中文格式
-        chinese_patterns = [
-            r'第[一二三四五六七八九十\d]+章第[一二三四五六七八九十\d]+节',
-            r'第[一二三四五六七八九十\d]+章[^第]*',
-            r'第[一二三四五六七八九十\d]+节',
-            r'([一二三四五六七八九十百千万\d]+)[、，。]',
-        ]
-        
-        for pattern in chinese_patterns:
-            match = re.search(pattern, text_str)
-            if match:
-                matched_text = match.group(0).strip()
-                matched_text = ChapterMatcher.remove_english_text(matched_text)
-                if '、' in matched_text or '，' in matched_text or '。' in matched_text:
-                    num_match = re.search(r'([一二三四五六七八九十百千万\d]+)', matched_text)
-                    if num_match:
-                        return num_match.group(1).strip()
-                return matched_text.rstrip('、，。')
-        
-        chapter_match = re.search(r'(\d+(?:\.\d+)*|第[一二三四五六七八九十\d]+章|第[一二三四五六七八九十\d]+节|[一二三四五六七八九十百千万\d]+)[、，。]?', text_str)
-        if chapter_match:
-            chapter = chapter_match.group(1).strip()
-            chapter = ChapterMatcher.remove_english_text(chapter)
-            if re.match(r'^[一二三四五六七八九十百千万]+$', chapter):
-                return chapter
-            if re.match(r'^\d+(?:\.\d+)*$', chapter):
-                return chapter
-            if '第' in chapter and ('章' in chapter or '节' in chapter):
-                return chapter.rstrip('、，。')
-        
-        normalized = ChapterMatcher.normalize_chapter(text_str)
-        return normalized if normalized and normalized != text_str.rstrip('.') else None
+        return _extract_chapter_info(str(text))
     
     @staticmethod
-    def get_chapter_levels(chapter: str) -> List[int]:
-        """将章节编号转换为数字列表，用于比较层级"""
+    def get_chapter_levels(chapter: str) -> Tuple[int, ...]:
+        """将章节编号转换为数字元组，用于比较层级"""
         if not chapter:
-            return []
-        
-        normalized = ChapterMatcher.normalize_chapter(chapter)
-        if not normalized:
-            return []
-        
-        if re.match(r'^\d+(?:\.\d+)*$', normalized):
-            try:
-                return [int(x) for x in normalized.split('.')]
-            except (ValueError, AttributeError):
-                return []
-        
-        chapter_match = re.match(r'第([一二三四五六七八九十\d]+)章', normalized)
-        if chapter_match:
-            num_str = chapter_match.group(1)
-            num = ChapterMatcher.chinese_to_arabic(num_str)
-            if num is not None:
-                return [num]
-        
-        section_match = re.match(r'第([一二三四五六七八九十\d]+)节', normalized)
-        if section_match:
-            num_str = section_match.group(1)
-            num = ChapterMatcher.chinese_to_arabic(num_str)
-            if num is not None:
-                return [num]
-        
-        if re.match(r'^[一二三四五六七八九十百千万]+$', normalized):
-            num = ChapterMatcher.chinese_to_arabic(normalized)
-            if num is not None:
-                return [num]
-        
-        return []
+            return ()
+        return _chapter_levels(str(chapter))
+    
+    @staticmethod
+    def cache_clear() -> None:
+        """清空章节解析缓存（例如一次评测结束后释放内存）"""
+        _normalize_chapter.cache_clear()
+        _extract_chapter_info.cache_clear()
+        _chapter_levels.cache_clear()
     
     @staticmethod
     def is_parent_chapter(chapter_a: str, chapter_b: str) -> bool:
@@ -224,17 +199,29 @@ class ChapterMatcher:
         if not chapter_a or not chapter_b:
             return False
         
-        chapter_a = ChapterMatcher.normalize_chapter(chapter_a)
-        chapter_b = ChapterMatcher.normalize_chapter(chapter_b)
-        
+        return ChapterMatcher._is_parent_normalized(
+            ChapterMatcher.normalize_chapter(chapter_a),
+            ChapterMatcher.normalize_chapter(chapter_b),
+        )
+    
+    @staticmethod
+    def _is_parent_normalized(
+        chapter_a: str,
+        chapter_b: str,
+        levels_a: Optional[Tuple[int, ...]] = None,
+        levels_b: Optional[Tuple[int, ...]] = None,
+    ) -> bool:
+        """is_parent_chapter 的主体，输入为已规范化的章节；调用方已算好层级时可直接传入"""
         if not chapter_a or not chapter_b:
             return False
         
         if chapter_a == chapter_b:
             return False
         
-        levels_a = ChapterMatcher.get_chapter_levels(chapter_a)
-        levels_b = ChapterMatcher.get_chapter_levels(chapter_b)
+        if levels_a is None:
+            levels_a = _chapter_levels(chapter_a)
+        if levels_b is None:
+            levels_b = _chapter_levels(chapter_b)
         
         if levels_a and levels_b:
             if len(levels_a) < len(levels_b):
@@ -259,17 +246,51 @@ class ChapterMatcher:
         if not retrieved_chapter or not reference_chapter:
             return False
         
-        retrieved_normalized = ChapterMatcher.normalize_chapter(retrieved_chapter)
-        reference_normalized = ChapterMatcher.normalize_chapter(reference_chapter)
+        # 热点路径：直接调用模块级缓存函数，省去 normalize_chapter 包装层的函数调用
+        retrieved_chapter = str(retrieved_chapter)
+        reference_chapter = str(reference_chapter)
         
+        # 原样相等时规范化结果必然相等，只需确认规范化后非空
+        if retrieved_chapter is reference_chapter or retrieved_chapter == reference_chapter:
+            return bool(_normalize_chapter(retrieved_chapter))
+        
+        return ChapterMatcher._match_normalized(
+            _normalize_chapter(retrieved_chapter),
+            _normalize_chapter(reference_chapter),
+        )
+    
+    @staticmethod
+    def is_valid_match_batch(retrieved_chapters: Sequence[str], reference_chapter: str) -> List[bool]:
+        """批量判断多个检索章节是否匹配同一标注章节（结果与逐个调用 is_valid_match 一致），标注章节只规范化一次"""
+        if not reference_chapter:
+            return [False] * len(retrieved_chapters)
+        
+        reference_chapter = str(reference_chapter)
+        reference_normalized = _normalize_chapter(reference_chapter)
+        
+        matches = []
+        for retrieved_chapter in retrieved_chapters:
+            if not retrieved_chapter:
+                matches.append(False)
+                continue
+            retrieved_chapter = str(retrieved_chapter)
+            if retrieved_chapter == reference_chapter:
+                matches.append(bool(reference_normalized))
+            else:
+                matches.append(ChapterMatcher._match_normalized(_normalize_chapter(retrieved_chapter), reference_normalized))
+        return matches
+    
+    @staticmethod
+    def _match_normalized(retrieved_normalized: str, reference_normalized: str) -> bool:
+        """is_valid_match 的主体，输入为已规范化的检索章节和标注章节"""
         if not retrieved_normalized or not reference_normalized:
             return False
         
         if retrieved_normalized == reference_normalized:
             return True
         
-        retrieved_levels = ChapterMatcher.get_chapter_levels(retrieved_normalized)
-        reference_levels = ChapterMatcher.get_chapter_levels(reference_normalized)
+        retrieved_levels = _chapter_levels(retrieved_normalized)
+        reference_levels = _chapter_levels(reference_normalized)
         
         if retrieved_levels and reference_levels:
             if retrieved_levels == reference_levels:
@@ -279,11 +300,116 @@ class ChapterMatcher:
                 if retrieved_levels[0] == reference_levels[0]:
                     return True
         
-        if ChapterMatcher.is_parent_chapter(retrieved_normalized, reference_normalized):
-            return True
-        
-        if ChapterMatcher.is_parent_chapter(reference_normalized, retrieved_normalized):
-            return False
-        
-        return False
+        # 父章节判断沿用 is_parent_chapter 的再规范化（带尾随空白等少数输入并非幂等，
+        # 命中缓存几乎无开销）；结果未变时复用上面已算好的层级。
+        # 反向（参考章节是检索章节的父章节）不算匹配，无需再判断
+        retrieved_parent = _normalize_chapter(retrieved_normalized)
+        reference_parent = _normalize_chapter(reference_normalized)
+        return ChapterMatcher._is_parent_normalized(
+            retrieved_parent,
+            reference_parent,
+            retrieved_levels if retrieved_parent == retrieved_normalized else None,
+            reference_levels if reference_parent == reference_normalized else None,
+        )
+
 
+# 以下三个函数是纯函数，同一章节字符串在评测中会反复出现，按输入缓存结果。
+# 参数须为 str（由 ChapterMatcher 的同名方法负责空值判断和 str() 转换）。
+
+@lru_cache(maxsize=8192)
+def _normalize_chapter(chapter: str) -> str:
+    chapter = chapter.strip()
+    chapter = ChapterMatcher.remove_english_text(chapter)
+    chapter = chapter.rstrip('.')
+    
+    match = _RE_LEADING_NUMERIC.match(chapter)
+    if match:
+        return match.group(1)
+    
+    match = _search_by_priority(_RE_NORMALIZE_UNION, _NORMALIZE_ORDER, chapter)
+    if match:
+        matched = match.group(0).rstrip('.')
+        matched = ChapterMatcher.remove_english_text(matched)
+        return matched
+    
+    return chapter
+
+
+# extract_chapter_info 还会被用于每个检索 chunk 的 document_name / 元数据 / 正文，
+# 不同用例间大量重复，缓存容量相应放大（run_evaluation 在任务前后都会清空）
+@lru_cache(maxsize=16384)
+def _extract_chapter_info(text: str) -> Optional[str]:
+    text_str = text.strip()
+    if not text_str:
+        return None
+    
+    text_str = ChapterMatcher.remove_english_text(text_str)
+    
+    # 匹配数字格式（如 1.2.3）；"2.0x" 这类写法去掉末尾的 .0
+    match = _RE_LEADING_NUMERIC.match(text_str)
+    if match:
+        numeric = match.group(1)
+        end = match.end()
+        if end < len(text_str) and text_str[end] in ('x', 'X') and numeric.endswith('.0'):
+            numeric = numeric[:-2]
+        return numeric
+    
+    # 匹配中文格式：先一次匹配章/节模式，未命中时再找 "数字+标点" 形式
+    match = _search_by_priority(_RE_EXTRACT_UNION, _EXTRACT_ORDER, text_str) or _RE_CJK_NUM_PUNCT.search(text_str)
+    if match:
+        # remove_english_text 的结果已去掉首尾空白；不含中文标点时无需再 rstrip
+        matched_text = ChapterMatcher.remove_english_text(match.group(0))
+        if '、' in matched_text or '，' in matched_text or '。' in matched_text:
+            num_match = _RE_CJK_NUM_SEARCH.search(matched_text)
+            if num_match:
+                return num_match.group(1)
+            return matched_text.rstrip('、，。')
+        return matched_text
+    
+    chapter_match = _RE_CHAPTER_ANY.search(text_str)
+    if chapter_match:
+        # 分组只含数字、"第"、"章"、"节"，不含空白、英文和标点，取出后无需再清理
+        chapter = chapter_match.group(1)
+        if _is_cjk_numeral(chapter):
+            return chapter
+        if _RE_NUM_DOT.fullmatch(chapter):
+            return chapter
+        if '第' in chapter and ('章' in chapter or '节' in chapter):
+            return chapter
+    
+    normalized = _normalize_chapter(text_str)
+    return normalized if normalized and normalized != text_str.rstrip('.') else None
+
+
+@lru_cache(maxsize=8192)
+def _chapter_levels(chapter: str) -> Tuple[int, ...]:
+    normalized = _normalize_chapter(chapter)
+    if not normalized:
+        return ()
+    
+    if _RE_NUM_DOT.fullmatch(normalized):
+        try:
+            return tuple(int(x) for x in normalized.split('.'))
+        except (ValueError, AttributeError):
+            return ()
+    
+    chapter_match = _RE_CHAP_NUM.match(normalized)
+    if chapter_match:
+        num_str = chapter_match.group(1)
+        num = ChapterMatcher.chinese_to_arabic(num_str)
+        if num is not None:
+            return (num,)
+    
+    section_match = _RE_SEC_NUM.match(normalized)
+    if section_match:
+        num_str = section_match.group(1)
+        num = ChapterMatcher.chinese_to_arabic(num_str)
+        if num is not None:
+            return (num,)
+    
+    if _is_cjk_numeral(normalized):
+        num = ChapterMatcher.chinese_to_arabic(normalized)
+        if num is not None:
+            return (num,)
+    
+    return ()
@@ -4,20 +4,40 @@
 import csv
 import json
 import logging
+import math
 import os
+import pickle
+import tempfile
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional, Callable, Awaitable, Literal
+from typing import List, Dict, Optional, Callable, Awaitable, Literal, Iterator, Sequence
 from dataclasses import dataclass
+from functools import lru_cache
 import asyncio
 import time
 import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from config.paths import DATA_EVALUATION_DIR
 
 from services.chapter_matcher import ChapterMatcher
+from services.llm_client import MAX_CONCURRENT_REQUESTS as LLM_MAX_CONCURRENT
 from services.ragas_evaluator import RagasEvaluator
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow 为可选依赖，未安装时使用 pandas 的 C 解析器读取 CSV
+    pa = None
+    pacsv = None
+
 # 增加 CSV 字段大小限制（默认 131072 字节，增加到 10MB）
 csv.field_size_limit(min(sys.maxsize, 10 * 1024 * 1024))
 
@@ -26,10 +46,28 @@ logger = logging.getLogger(__name__)
 # 评测模式类型
 EvaluationMode = Literal["chapter_match", "ragas", "hybrid"]
 
+# 评测并发数（默认5，可以通过环境变量配置，最多不超过LLM_MAX_CONCURRENT）
+# 如果有多个worker，可以设置为worker数量以充分利用资源
+EVAL_MAX_CONCURRENT = int(os.getenv("EVAL_MAX_CONCURRENT", "5"))
+
+# 章节匹配模式的多进程评测配置：用例数达到阈值时才启用，避免小文件承担进程启动开销
+# 默认进程数取当前进程可用的 CPU 数（遵循 CPU 亲和性设置，容器中不会按宿主机核数启动）
+_AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (multiprocessing.cpu_count() or 4)
+EVAL_PROCESS_WORKERS = int(os.getenv("EVAL_PROCESS_WORKERS", _AVAILABLE_CPUS))
+EVAL_PROCESS_MIN_CASES = int(os.getenv("EVAL_PROCESS_MIN_CASES", "1000"))
+# 进程池在 FastAPI 服务进程中创建，其中已有线程池、httpx 等线程；fork 出的子进程可能继承被其他线程持有的锁而死锁，
+# 因此使用 forkserver（不支持时用 spawn）启动子进程
+_PROCESS_POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# 评测进度汇总日志的分隔线
+_PROGRESS_RULE = "━" * 72
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TestCase:
-    """测试用例结构"""
+    """测试用例结构（加载后只读，可哈希，可作为缓存键；使用 slots，测试用例数量大时可明显减少每个实例的内存）"""
     question: str
     answer: str  # 完整答案
     answer_chapter: str  # 从答案中提取的章节信息
@@ -37,12 +75,51 @@ class TestCase:
     type: Optional[str] = None
     theme: Optional[str] = None
     retrieved_context: str = ""  # 检索到的上下文（用于Ragas评测）
-    retrieved_chunks_json: str = ""  # 检索到的完整chunks列表（JSON格式，用于召回率@K计算）
+    retrieved_chunks_json: str = ""  # 检索到的完整chunks列表（JSON格式，用于召回率@K计算；没有标注章节时加载为空）
     retrieval_time: float = 0.0  # 检索响应时间（秒）
     generation_time: float = 0.0  # 生成响应时间（秒）
     total_time: float = 0.0  # 总响应时间（秒）
 
 
+def _json_loads(text):
+    """解析 JSON 字符串；安装了 orjson 时用 orjson（其 JSONDecodeError 是 json.JSONDecodeError 的子类）"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _json_dumps(obj) -> str:
+    """
+    序列化为紧凑的 JSON 字符串（非 ASCII 字符原样保留）；orjson 无法序列化的对象退回标准库 json
+    
+    标准库分支使用与 orjson 相同的紧凑分隔符，输出格式不随是否安装 orjson 而变化
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _write_json_file(path: Path, obj) -> None:
+    """以缩进 2 格、保留非 ASCII 字符的格式写出 JSON 文件；安装了 orjson 时用 orjson（NumPy 标量直接序列化）"""
+    if orjson is not None:
+        try:
+            path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+            return
+        except TypeError:
+            pass
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
+@lru_cache(maxsize=16384)
+def _match_cached(retrieved_chapter: str, reference_chapter: str) -> bool:
+    """按（检索章节, 参考章节）缓存匹配结果；同一参考章节会与相同的检索章节反复比较"""
+    return ChapterMatcher.is_valid_match(retrieved_chapter, reference_chapter)
+
+
 class MetricsCalculator:
     """指标计算器 - 基于章节匹配逻辑"""
     
@@ -52,15 +129,13 @@ class MetricsCalculator:
         if not reference_chapter:
             return {'correct_count': 0, 'total_count': 0, 'accuracy': 0.0, 'recall': 0.0}
         
-        correct_count = 0
-        total_retrieved = len(retrieved_chapters)
-        
-        for retrieved_chapter in retrieved_chapters:
-            if ChapterMatcher.is_valid_match(retrieved_chapter, reference_chapter):
-                correct_count += 1
+        # 标注章节只规范化一次，得到整组检索章节的匹配掩码
+        mask = np.asarray(ChapterMatcher.is_valid_match_batch(retrieved_chapters, reference_chapter), dtype=bool)
+        correct_count = int(mask.sum())
+        total_retrieved = mask.size
         
         accuracy = correct_count / total_retrieved if total_retrieved > 0 else 0.0
-        recall = 1.0 if correct_count > 0 else 0.0
+        recall = 1.0 if mask.any() else 0.0
         
         return {
             'correct_count': correct_count,
@@ -74,11 +149,13 @@ class MetricsCalculator:
         """计算Recall@K"""
         if not reference_chapter:
             return 0.0
-        retrieved_k = retrieved_chapters[:k]
-        for chapter in retrieved_k:
-            if ChapterMatcher.is_valid_match(chapter, reference_chapter):
-                return 1.0
-        return 0.0
+        return 1.0 if any(_match_cached(chapter, reference_chapter) for chapter in retrieved_chapters[:k]) else 0.0
+
+
+# chunk metadata 中可能携带章节信息的字段（按优先级排列）；其他字段（ID、时间戳等）不参与提取
+CHUNK_CHAPTER_METADATA_FIELDS = ('document_name', 'source', 'title', 'section', 'heading', 'chapter')
+# 从 chunk 正文提取章节时最多扫描的字符数
+CONTENT_SCAN_LIMIT = 4096
 
 
 def extract_chapter_from_chunk(chunk: Dict) -> Optional[str]:
@@ -96,27 +173,20 @@ def extract_chapter_from_chunk(chunk: Dict) -> Optional[str]:
     if not isinstance(chunk, dict):
         return None
     
-    # 方法1：从metadata中提取
+    # 方法1：从metadata中提取（只看可能携带章节信息的字段，按优先级依次尝试）
     metadata = chunk.get('metadata', {})
     if isinstance(metadata, dict):
-        # 尝试从document_name或其他metadata字段提取
-        document_name = metadata.get('document_name', '')
-        if document_name:
-            chapter_info = ChapterMatcher.extract_chapter_info(document_name)
-            if chapter_info:
-                return chapter_info
-        
-        # 尝试从其他metadata字段提取
-        for key, value in metadata.items():
+        for key in CHUNK_CHAPTER_METADATA_FIELDS:
+            value = metadata.get(key)
             if isinstance(value, str) and value:
                 chapter_info = ChapterMatcher.extract_chapter_info(value)
                 if chapter_info:
                     return chapter_info
     
-    # 方法2：从content中提取
+    # 方法2：从content中提取（章节信息通常在开头，只扫描前 CONTENT_SCAN_LIMIT 个字符）
     content = chunk.get('content', '')
     if content:
-        chapter_info = ChapterMatcher.extract_chapter_info(content)
+        chapter_info = ChapterMatcher.extract_chapter_info(content[:CONTENT_SCAN_LIMIT])
         if chapter_info:
             return chapter_info
     
@@ -132,7 +202,7 @@ def extract_chapter_from_chunk(chunk: Dict) -> Optional[str]:
     return None
 
 
-def calculate_generalization_score(results_by_type: Dict[str, List[float]]) -> float:
+def calculate_generalization_score(results_by_type: Dict[str, Sequence[float]]) -> float:
     """
     计算泛化性得分
     
@@ -140,7 +210,7 @@ def calculate_generalization_score(results_by_type: Dict[str, List[float]]) -> f
     得分越高，说明系统对不同类型问题的处理能力越均衡
     
     Args:
-        results_by_type: 按问题类型分组的得分列表，格式：{"S1": [0.8, 0.9, ...], "S2": [0.7, 0.8, ...], ...}
+        results_by_type: 按问题类型分组的得分（列表或 np.ndarray），格式：{"S1": [0.8, 0.9, ...], "S2": [0.7, 0.8, ...], ...}
     
     Returns:
         泛化性得分（0-1之间）
@@ -148,20 +218,16 @@ def calculate_generalization_score(results_by_type: Dict[str, List[float]]) -> f
     if not results_by_type:
         return 0.0
     
-    # 计算各类型问题的平均得分
-    type_scores = {}
-    for q_type, scores in results_by_type.items():
-        if scores and len(scores) > 0:
-            type_scores[q_type] = np.mean(scores)
+    # 计算各类型问题的平均得分（每个类型一次向量化求均值）
+    all_scores = [float(np.mean(scores)) for scores in results_by_type.values() if len(scores) > 0]
     
-    if not type_scores or len(type_scores) < 2:
+    if len(all_scores) < 2:
         # 如果只有一种类型或没有数据，无法计算泛化性
         return 0.0
     
-    # 计算所有类型得分的平均值和标准差
-    all_scores = list(type_scores.values())
-    avg_score = np.mean(all_scores)
-    std_score = np.std(all_scores)
+    # 计算所有类型得分的平均值和（总体）标准差；类型最多只有几个，直接用标量运算，省去 numpy 调用开销
+    avg_score = sum(all_scores) / len(all_scores)
+    std_score = math.sqrt(sum((score - avg_score) ** 2 for score in all_scores) / len(all_scores))
     
     if avg_score == 0:
         return 0.0
@@ -171,9 +237,22 @@ def calculate_generalization_score(results_by_type: Dict[str, List[float]]) -> f
     cv = std_score / avg_score if avg_score > 0 else float('inf')
     # 将CV映射到0-1：CV越小，泛化性越高
     # 使用指数衰减：generalization = exp(-cv)，当cv=0时得1，cv增大时得分降低
-    generalization = np.exp(-min(cv, 2.0))  # 限制cv最大为2.0，避免得分过低
+    generalization = math.exp(-min(cv, 2.0))  # 限制cv最大为2.0，避免得分过低
+    
+    return max(0.0, min(1.0, generalization))
+
+
+def first_match_index(chunks: list, reference_chapter: str, max_k: int) -> int:
+    """
+    返回前 max_k 个chunks中第一个章节与参考章节匹配的位置，没有匹配时返回 max_k
     
-    return float(max(0.0, min(1.0, generalization)))
+    Recall@K 即 first_match_index(...) < K，多个K共用一次遍历
+    """
+    for index, chunk in enumerate(chunks[:max_k]):
+        chunk_chapter = extract_chapter_from_chunk(chunk)
+        if chunk_chapter and _match_cached(chunk_chapter, reference_chapter):
+            return index
+    return max_k
 
 
 def calculate_recall_at_k_from_chunks(retrieved_chunks_json: str, reference_chapter: str, k: int) -> float:
@@ -192,72 +271,266 @@ def calculate_recall_at_k_from_chunks(retrieved_chunks_json: str, reference_chap
         return 0.0
     
     try:
-        chunks = json.loads(retrieved_chunks_json)
+        chunks = _json_loads(retrieved_chunks_json)
         if not isinstance(chunks, list) or len(chunks) == 0:
             return 0.0
         
-        # 提取前K个chunks的章节信息
-        top_k_chunks = chunks[:k]
-        for chunk in top_k_chunks:
-            chunk_chapter = extract_chapter_from_chunk(chunk)
-            if chunk_chapter and ChapterMatcher.is_valid_match(chunk_chapter, reference_chapter):
-                return 1.0
-        
-        return 0.0
+        return 1.0 if first_match_index(chunks, reference_chapter, k) < k else 0.0
     except (json.JSONDecodeError, TypeError) as e:
         logger.warning(f"解析retrieved_chunks_json失败: {e}")
         return 0.0
 
 
-def load_test_cases_from_csv(csv_path: str) -> List[TestCase]:
-    """从 CSV 文件加载测试用例（用于评测）"""
-    test_cases = []
-    
-    with open(csv_path, "r", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # 兼容旧格式（没有 answer_chapter 或 retrieved_context 字段）
-            answer = row.get("answer", "").strip()
-            answer_chapter = row.get("answer_chapter", "").strip()
-            retrieved_context = row.get("retrieved_context", "").strip()
-            retrieved_chunks_json = row.get("retrieved_chunks_json", "").strip()
-            
-            # 解析性能指标（兼容旧格式）
-            retrieval_time = float(row.get("retrieval_time", "0") or "0")
-            generation_time = float(row.get("generation_time", "0") or "0")
-            total_time = float(row.get("total_time", "0") or "0")
-            
-            # 如果 answer_chapter 为空但 answer 不为空，尝试从 answer 提取章节
-            if not answer_chapter and answer:
-                answer_chapter = ChapterMatcher.extract_chapter_info(answer) or ""
-            
-            test_cases.append(TestCase(
-                question=row.get("question", "").strip(),
-                answer=answer,  # 完整答案
-                answer_chapter=answer_chapter,  # 章节信息
-                reference=row.get("reference", "").strip(),  # 标注的章节
-                type=row.get("type", "").strip() or None,
-                theme=row.get("theme", "").strip() or None,
-                retrieved_context=retrieved_context,  # 检索上下文
-                retrieved_chunks_json=retrieved_chunks_json,  # 完整chunks列表
-                retrieval_time=retrieval_time,
-                generation_time=generation_time,
-                total_time=total_time,
-            ))
+# 评测结果中输出的召回率@K
+RECALL_AT_KS = (3, 5, 10)
+
+
+def calculate_recall_at_ks_from_chunks(
+    retrieved_chunks_json: str,
+    reference_chapter: Optional[str],
+    ks=RECALL_AT_KS,
+) -> Dict[int, float]:
+    """
+    从检索到的chunks JSON中一次性计算多个K的Recall@K
+    
+    JSON 只解析一次，前 max(ks) 个chunks只遍历一次，找到第一个匹配的位置即停止；
+    结果与对每个K分别调用 calculate_recall_at_k_from_chunks 一致
+    
+    Returns:
+        {K: Recall@K得分（0.0或1.0）}
+    """
+    recalls = {k: 0.0 for k in ks}
+    if not retrieved_chunks_json or not reference_chapter:
+        return recalls
+    
+    try:
+        chunks = _json_loads(retrieved_chunks_json)
+        if not isinstance(chunks, list) or len(chunks) == 0:
+            return recalls
+        
+        index = first_match_index(chunks, reference_chapter, max(ks))
+        return {k: 1.0 if index < k else 0.0 for k in ks}
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.warning(f"解析retrieved_chunks_json失败: {e}")
+        return recalls
+
+
+# 评测 CSV 的文本列与耗时列（顺序与 TestCase 字段一致，缺失列按空值处理以兼容旧格式）
+_CASE_TEXT_COLUMNS = (
+    "question", "answer", "answer_chapter", "reference", "type", "theme",
+    "retrieved_context", "retrieved_chunks_json",
+)
+_CASE_TIME_COLUMNS = ("retrieval_time", "generation_time", "total_time")
+
+
+# 召回率@K 与耗时列：run_evaluation 在结果到达时直接写入 NumPy 列缓冲区，不经过 DataFrame
+_RECALL_COLUMNS = tuple(f"recall_at_{k}" for k in RECALL_AT_KS)
+_METRIC_BUFFER_COLUMNS = (*_RECALL_COLUMNS, *_CASE_TIME_COLUMNS)
+
+# run_evaluation 汇总统计用到的其他结果列（_ResultSpool 在内存中只保留这些字段）
+_SUMMARY_COLUMNS = frozenset({
+    "type",
+    "chapter_match_accuracy", "chapter_match_recall", "chapter_matched",
+    "ragas_factual_correctness_score",
+    "ragas_factual_correctness_tp", "ragas_factual_correctness_fp", "ragas_factual_correctness_fn",
+    "ragas_faithfulness_score", "ragas_faithfulness_faithful_count", "ragas_faithfulness_total_count",
+    "ragas_context_relevance_score", "ragas_relevancy_score",
+    "ragas_core_score", "ragas_overall_score", "ragas_quality_score",
+    "hybrid_score", "hybrid_matched",
+})
+
+
+# pyarrow 按块解析 CSV，一行必须落在一个块内；块大小需大于 CSV 单字段上限（10MB）
+_PYARROW_CSV_BLOCK_SIZE = 32 << 20
+
+
+def _is_blank_csv(csv_path: str) -> bool:
+    """CSV 文件为空（或只有 BOM、空白）时返回 True"""
+    with open(csv_path, "rb") as f:
+        return not f.read().lstrip(b"\xef\xbb\xbf").strip()
+
+
+def _iter_csv_frames(csv_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    按 batch_size 行分块产出评测 CSV 的 DataFrame（所有列按字符串读取，空字段保持为空字符串）
+    
+    安装了 pyarrow 时用其多线程解析器一次读入整个文件，再按块转换为 DataFrame；
+    否则用 pandas 的 C 解析器分块读取。空文件不产出任何分块（由调用方按没有测试用例处理）
+    """
+    if pacsv is not None:
+        columns = [*_CASE_TEXT_COLUMNS, *_CASE_TIME_COLUMNS]
+        try:
+            table = pacsv.read_csv(
+                csv_path,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=_PYARROW_CSV_BLOCK_SIZE),
+                # 答案、上下文等字段可能包含换行
+                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                # 缺失的列补为空值（之后统一填充为空字符串），兼容旧格式
+                convert_options=pacsv.ConvertOptions(
+                    column_types={col: pa.string() for col in columns},
+                    include_columns=columns,
+                    include_missing_columns=True,
+                    strings_can_be_null=False,
+                ),
+            )
+        except pa.ArrowInvalid:
+            # pyarrow 对空文件报 "Empty CSV file"；其他解析错误照常抛出
+            if _is_blank_csv(csv_path):
+                return
+            raise
+        for offset in range(0, table.num_rows, batch_size):
+            yield table.slice(offset, batch_size).to_pandas()
+        return
+    
+    try:
+        reader = pd.read_csv(
+            csv_path, encoding="utf-8-sig", dtype=str, keep_default_na=False, engine="c", chunksize=batch_size
+        )
+    except pd.errors.EmptyDataError:
+        return
+    with reader:
+        yield from reader
+
+
+# 汇总统计中按问题类型分组的类型标签（type 列中包含该标签即计入，不区分大小写）
+_QUESTION_TYPES = ("S1", "S2", "S3", "S4", "S5", "S6")
+
+# 汇总统计中需要求均值、总和的 Ragas 指标列
+_RAGAS_SUMMARY_COLUMNS = (
+    "ragas_factual_correctness_score",
+    "ragas_factual_correctness_tp", "ragas_factual_correctness_fp", "ragas_factual_correctness_fn",
+    "ragas_faithfulness_score", "ragas_faithfulness_faithful_count", "ragas_faithfulness_total_count",
+    "ragas_context_relevance_score", "ragas_relevancy_score",
+    "ragas_core_score", "ragas_overall_score", "ragas_quality_score",
+)
+
+# 汇总中按列均值输出的 Ragas 指标：(结果列, 汇总字段)，同时输出 {汇总字段}_percentage
+_RAGAS_MEAN_METRICS = (
+    # 核心指标：Factual Correctness（事实正确性）、Faithfulness（忠实度）
+    ("ragas_factual_correctness_score", "ragas_factual_correctness_score"),
+    ("ragas_faithfulness_score", "ragas_faithfulness_score"),
+    # 辅助指标：Context Relevance（上下文相关性）、Answer Relevancy（答案相关性）
+    ("ragas_context_relevance_score", "ragas_context_relevance_score"),
+    ("ragas_relevancy_score", "ragas_relevancy_score"),
+    ("ragas_relevancy_score", "ragas_satisfaction_score"),  # 用户满意度 = 相关性
+    # 核心得分（Factual Correctness + Faithfulness的平均值）与综合得分
+    ("ragas_core_score", "ragas_core_score"),
+    ("ragas_overall_score", "ragas_overall_score"),
+    # 兼容旧字段：quality_score（映射到factual_correctness）
+    ("ragas_quality_score", "ragas_quality_score"),
+)
+
+# 优化建议规则（基于论文的核心指标）：(汇总字段, 阈值, 类别, 指标名称, 建议)，汇总值低于阈值时给出建议
+_OPTIMIZATION_RULES = (
+    # 核心指标1：Factual Correctness（事实正确性）
+    ("ragas_factual_correctness_score", 0.7, "答案质量优化", "事实正确性（Factual Correctness）",
+     "事实正确性得分较低，建议优化生成模型或提示词，确保答案包含正确事实，减少错误事实和遗漏"),
+    # 核心指标2：Faithfulness（忠实度）
+    ("ragas_faithfulness_score", 0.7, "答案质量优化", "忠实度（Faithfulness）",
+     "忠实度得分较低，说明答案可能包含上下文之外的信息或编造内容，建议优化生成模型，确保答案基于提供的上下文"),
+    # 辅助指标：Context Relevance（上下文相关性）
+    ("ragas_context_relevance_score", 0.7, "检索优化", "上下文相关性（Context Relevance）",
+     "上下文相关性得分较低，建议优化检索系统：检查嵌入模型、调整top_k参数、优化查询理解"),
+    # 辅助指标：Answer Relevancy（答案相关性）
+    ("ragas_relevancy_score", 0.7, "提示词优化", "答案相关性（Answer Relevancy）",
+     "答案相关性得分较低，建议优化提示词工程，提高答案与问题的相关性，减少无关信息"),
+    # 兼容旧字段
+    ("ragas_quality_score", 0.7, "答案质量优化", "答案质量得分",
+     "答案质量得分较低，建议优化提示词，提高答案的准确性、完整性和一致性"),
+    # 检索优化建议
+    ("recall_at_10", 0.8, "检索优化", "召回率@10",
+     "召回率@10较低，建议优化检索系统：检查嵌入模型、调整top_k参数、降低相似度阈值"),
+    ("recall_at_5", 0.7, "检索优化", "召回率@5",
+     "召回率@5较低，建议优化检索系统：考虑使用重排序模型、调整向量相似度权重"),
+    # 泛化性优化建议
+    ("generalization_score", 0.6, "系统优化", "泛化性得分",
+     "泛化性得分较低，系统对不同类型问题的处理能力不均衡，建议检查特定类型问题的处理逻辑"),
+)
+
+# 按问题类型统计分布的 Ragas 指标列
+_RAGAS_TYPE_METRIC_COLUMNS = ("ragas_factual_correctness_score", "ragas_faithfulness_score", "ragas_relevancy_score")
+
+
+def _question_type_masks(types: Sequence) -> Dict[str, np.ndarray]:
+    """
+    计算每种问题类型（S1-S6）的行布尔掩码，等价于逐类型 types.str.contains(q_type, na=False, case=False)
+    
+    type 列的取值很少：先编码成整数（按首次出现顺序），只对去重后的取值做包含判断，再按编码映射回各行
+    """
+    uniques: Dict = {}
+    codes = np.fromiter((uniques.setdefault(value, len(uniques)) for value in types), dtype=np.intp, count=len(types))
+    upper_uniques = [value.upper() if isinstance(value, str) else "" for value in uniques]
+    masks = {}
+    for q_type in _QUESTION_TYPES:
+        hits = np.array([q_type in value for value in upper_uniques], dtype=bool)
+        masks[q_type] = hits[codes]
+    return masks
+
+
+def _summary_matrix(rows: List[Dict], columns: Sequence[str]) -> np.ndarray:
+    """把汇总行中的指定列取成 (行数, 列数) 的 float64 矩阵，缺失值和 None 记为 NaN"""
+    values = np.array([[row.get(col) for col in columns] for row in rows], dtype=np.float64)
+    return values.reshape(len(rows), len(columns))
+
+
+def iter_test_case_batches(csv_path: str, batch_size: int = 256) -> Iterator[List[TestCase]]:
+    """
+    分块读取 CSV，按批产出测试用例
+    
+    CSV 按列解析（有 pyarrow 时用 pyarrow.csv，否则用 pandas 分块读取），清洗、类型转换和章节提取也都按列完成；
+    同一时刻只有一个分块的 DataFrame 在内存中（使用 pyarrow 时原始数据以 Arrow 表整体驻留）
+    """
+    type_pos = _CASE_TEXT_COLUMNS.index("type")
+    theme_pos = _CASE_TEXT_COLUMNS.index("theme")
+    reference_pos = _CASE_TEXT_COLUMNS.index("reference")
     
+    for df in _iter_csv_frames(csv_path, batch_size):
+        df = df.reindex(columns=[*_CASE_TEXT_COLUMNS, *_CASE_TIME_COLUMNS], fill_value="").fillna("")
+        
+        for col in _CASE_TEXT_COLUMNS:
+            df[col] = df[col].str.strip()
+        # 没有标注章节时召回率@K 恒为 0，不会解析 chunks，无需保留这一列
+        df.loc[df["reference"] == "", "retrieved_chunks_json"] = ""
+        # 耗时列中的空值或无法解析的值（如 "N/A"）记为 0
+        for col in _CASE_TIME_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+        
+        # 如果 answer_chapter 为空但 answer 不为空，从 answer 提取章节（重复答案命中解析缓存）
+        missing_chapter = (df["answer_chapter"] == "") & (df["answer"] != "")
+        if missing_chapter.any():
+            df.loc[missing_chapter, "answer_chapter"] = (
+                df.loc[missing_chapter, "answer"].map(ChapterMatcher.extract_chapter_info).fillna("")
+            )
+        
+        columns = [df[col].tolist() for col in (*_CASE_TEXT_COLUMNS, *_CASE_TIME_COLUMNS)]
+        # type / theme / reference 取值很少，驻留后各行共享同一个字符串对象；type / theme 为空时记为 None
+        columns[reference_pos] = [sys.intern(value) for value in columns[reference_pos]]
+        for pos in (type_pos, theme_pos):
+            columns[pos] = [sys.intern(value) if value else None for value in columns[pos]]
+        yield [TestCase(*row) for row in zip(*columns)]
+
+
+def load_test_cases_from_csv(csv_path: str) -> List[TestCase]:
+    """从 CSV 文件加载测试用例（用于评测）：按批读取并合并所有测试用例"""
+    test_cases = [test_case for batch in iter_test_case_batches(csv_path) for test_case in batch]
     logger.info(f"从 CSV 加载测试用例用于评测: {len(test_cases)} 条")
     return test_cases
 
 
-def evaluate_chapter_match(test_case: TestCase) -> Dict:
+def evaluate_chapter_match(test_case: TestCase, reference_chapter: Optional[str] = None) -> Dict:
     """
     使用章节匹配方法评测单个测试用例
     
     比较检索得到的章节（answer_chapter）和标注的章节（reference）
+    
+    Args:
+        test_case: 测试用例
+        reference_chapter: 调用方已从 reference 提取的章节（可选，未提供时在此提取）
     """
     # 提取章节信息
     answer_chapter = test_case.answer_chapter or (ChapterMatcher.extract_chapter_info(test_case.answer) if test_case.answer else None)
-    reference_chapter = ChapterMatcher.extract_chapter_info(test_case.reference) if test_case.reference else None
+    if reference_chapter is None:
+        reference_chapter = ChapterMatcher.extract_chapter_info(test_case.reference) if test_case.reference else None
     
     # 计算准确率（二元：是否匹配）
     accuracy = 1.0 if (answer_chapter and reference_chapter and 
@@ -275,6 +548,32 @@ def evaluate_chapter_match(test_case: TestCase) -> Dict:
     }
 
 
+# 问题或答案为空、未送 Ragas 评测的用例记录的 ragas_error
+_RAGAS_SKIPPED_ERROR = "missing_inputs"
+
+
+def _ragas_failure_result(reason: str, error: str, overall_score: Optional[float] = 0.0) -> Dict:
+    """
+    Ragas 未能给出评分时的结果字段（各指标置空，综合得分默认记 0）
+    
+    未评测（跳过）的用例传 overall_score=None，使其与各指标一样不计入汇总均值
+    """
+    return {
+        "ragas_factual_correctness_score": None,
+        "ragas_factual_correctness_reason": reason,
+        "ragas_faithfulness_score": None,
+        "ragas_faithfulness_reason": None,
+        "ragas_context_relevance_score": None,
+        "ragas_relevancy_score": None,
+        "ragas_overall_score": overall_score,
+        "ragas_core_score": None,
+        "ragas_error": error,
+        # 兼容旧字段
+        "ragas_quality_score": None,
+        "ragas_quality_reason": reason,
+    }
+
+
 async def evaluate_ragas(
     test_case: TestCase,
     ragas_evaluator: RagasEvaluator,
@@ -294,6 +593,11 @@ async def evaluate_ragas(
     Returns:
         Ragas 评测结果
     """
+    # 没有问题或答案时各项指标都无从评起，直接返回，不占用 LLM 请求和并发名额；
+    # 综合得分也置空，与核心得分、各指标一样不计入汇总
+    if not test_case.question.strip() or not test_case.answer.strip():
+        return _ragas_failure_result("评测跳过: 问题或答案为空", _RAGAS_SKIPPED_ERROR, overall_score=None)
+    
     try:
         # 优先使用检索上下文，如果没有则使用 reference
         context = test_case.retrieved_context if test_case.retrieved_context else test_case.reference
@@ -332,8 +636,8 @@ async def evaluate_ragas(
             "ragas_faithfulness_reason": faithfulness_result.get("reason", "") if faithfulness_result else None,
             
             # Faithfulness中间变量（新增）
-            "ragas_faithfulness_statements": json.dumps(faithfulness_statements, ensure_ascii=False) if faithfulness_statements else None,
-            "ragas_faithfulness_verdicts": json.dumps(faithfulness_verdicts, ensure_ascii=False) if faithfulness_verdicts else None,
+            "ragas_faithfulness_statements": _json_dumps(faithfulness_statements) if faithfulness_statements else None,
+            "ragas_faithfulness_verdicts": _json_dumps(faithfulness_verdicts) if faithfulness_verdicts else None,
             "ragas_faithfulness_faithful_count": faithfulness_faithful_count,
             "ragas_faithfulness_total_count": faithfulness_total_count,
             
@@ -359,39 +663,14 @@ async def evaluate_ragas(
         return result
     except Exception as e:
         logger.error(f"Ragas 评测失败: {e}", exc_info=True)
-        return {
-            "ragas_factual_correctness_score": None,
-            "ragas_factual_correctness_reason": f"评测失败: {str(e)}",
-            "ragas_faithfulness_score": None,
-            "ragas_faithfulness_reason": None,
-            "ragas_context_relevance_score": None,
-            "ragas_relevancy_score": None,
-            "ragas_overall_score": 0.0,
-            "ragas_core_score": None,
-            "ragas_error": str(e),
-            # 兼容旧字段
-            "ragas_quality_score": None,
-            "ragas_quality_reason": f"评测失败: {str(e)}",
-        }
+        return _ragas_failure_result(f"评测失败: {str(e)}", str(e))
 
 
-async def evaluate_single_case(
-    test_case: TestCase,
-    mode: EvaluationMode,
-    ragas_evaluator: Optional[RagasEvaluator] = None,
-    ragas_metrics_config: Optional[Dict[str, bool]] = None
-) -> Dict:
+def _evaluate_case_offline(test_case: TestCase, mode: EvaluationMode) -> Dict:
     """
-    评测单个测试用例
+    评测单个测试用例中不依赖 LLM 的部分（基础字段、召回率@K、章节匹配）
     
-    Args:
-        test_case: 测试用例
-        mode: 评测模式（chapter_match, ragas, hybrid）
-        ragas_evaluator: Ragas 评测器（ragas 或 hybrid 模式需要）
-        ragas_metrics_config: Ragas指标配置字典，用于选择性禁用某些指标
-    
-    Returns:
-        评测结果字典
+    纯 CPU 计算，可直接在子进程中执行
     """
     result = {
         "question": test_case.question,
@@ -406,33 +685,122 @@ async def evaluate_single_case(
         "total_time": test_case.total_time,
     }
     
-    # 计算召回率@K（检索优化指标）
-    if test_case.retrieved_chunks_json and test_case.reference:
-        reference_chapter = ChapterMatcher.extract_chapter_info(test_case.reference)
-        if reference_chapter:
-            result["recall_at_3"] = calculate_recall_at_k_from_chunks(
-                test_case.retrieved_chunks_json, reference_chapter, 3
-            )
-            result["recall_at_5"] = calculate_recall_at_k_from_chunks(
-                test_case.retrieved_chunks_json, reference_chapter, 5
-            )
-            result["recall_at_10"] = calculate_recall_at_k_from_chunks(
-                test_case.retrieved_chunks_json, reference_chapter, 10
-            )
-        else:
-            result["recall_at_3"] = 0.0
-            result["recall_at_5"] = 0.0
-            result["recall_at_10"] = 0.0
-    else:
-        result["recall_at_3"] = 0.0
-        result["recall_at_5"] = 0.0
-        result["recall_at_10"] = 0.0
+    # 标注章节只提取一次，召回率@K 和章节匹配共用
+    reference_chapter = ChapterMatcher.extract_chapter_info(test_case.reference) if test_case.reference else None
+    
+    # 计算召回率@K（检索优化指标）：chunks 只解析一次，一次遍历同时得到 @3/@5/@10
+    recalls = calculate_recall_at_ks_from_chunks(test_case.retrieved_chunks_json, reference_chapter, RECALL_AT_KS)
+    for k in RECALL_AT_KS:
+        result[f"recall_at_{k}"] = recalls[k]
     
     # 章节匹配评测
     if mode in ("chapter_match", "hybrid"):
-        chapter_result = evaluate_chapter_match(test_case)
+        chapter_result = evaluate_chapter_match(test_case, reference_chapter)
         result.update(chapter_result)
     
+    return result
+
+
+def _build_error_result(test_case: TestCase, error: Exception) -> Dict:
+    """评测失败时的占位结果"""
+    return {
+        "question": test_case.question,
+        "answer": test_case.answer,
+        "answer_chapter": test_case.answer_chapter,
+        "reference": test_case.reference,
+        "type": test_case.type,
+        "theme": test_case.theme,
+        "retrieved_context": test_case.retrieved_context,
+        "error": str(error)
+    }
+
+
+def _evaluate_cases_worker(test_cases: List[TestCase], mode: EvaluationMode) -> List[Dict]:
+    """Worker function for ProcessPoolExecutor：按批评测章节匹配模式的用例"""
+    results = []
+    for test_case in test_cases:
+        try:
+            results.append(_evaluate_case_offline(test_case, mode))
+        except Exception as e:
+            logger.error(f"评测用例失败: {e}", exc_info=True)
+            results.append(_build_error_result(test_case, e))
+    return results
+
+
+class _ResultSpool:
+    """
+    评测结果的落盘缓冲：结果按用例原始顺序逐条追加到临时文件，内存中只保留汇总统计需要的列
+    
+    并发评测时结果乱序到达，尚未轮到的结果暂存在 pending 中（数量约等于并发数）。
+    CSV 表头是所有结果字段的并集，要等全部结果写完才能确定，因此最后由 write_csv 顺序读回临时文件写出 CSV。
+    临时文件由 tempfile 创建（不在输出目录中），关闭即删除；作为上下文管理器使用，评测中途出错或被取消时也会关闭。
+    """
+    
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix="evaluation_results_", suffix=".pkl")
+        self._pending: Dict[int, Dict] = {}
+        self._next_idx = 1
+        self.columns: Dict[str, None] = {}  # 按首次出现顺序记录的结果字段（作有序集合用）
+        self.summary_rows: List[Dict] = []
+        self.count = 0
+    
+    def add(self, idx: int, result: Dict) -> None:
+        """登记第 idx 条（从 1 开始）用例的结果，并写出已连续到达的结果"""
+        self._pending[idx] = result
+        while self._next_idx in self._pending:
+            self._write(self._pending.pop(self._next_idx))
+            self._next_idx += 1
+    
+    def _write(self, result: Dict) -> None:
+        self.columns.update(dict.fromkeys(result))
+        pickle.dump(result, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.summary_rows.append({key: value for key, value in result.items() if key in _SUMMARY_COLUMNS})
+        self.count += 1
+    
+    def write_csv(self, csv_path: Path) -> None:
+        """把临时文件中的结果按顺序写成 CSV"""
+        self._file.flush()
+        self._file.seek(0)
+        with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.columns))
+            writer.writeheader()
+            while True:
+                try:
+                    writer.writerow(pickle.load(self._file))
+                except EOFError:
+                    break
+    
+    def close(self) -> None:
+        """关闭（即删除）临时文件"""
+        self._file.close()
+    
+    def __enter__(self) -> "_ResultSpool":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+async def evaluate_single_case(
+    test_case: TestCase,
+    mode: EvaluationMode,
+    ragas_evaluator: Optional[RagasEvaluator] = None,
+    ragas_metrics_config: Optional[Dict[str, bool]] = None
+) -> Dict:
+    """
+    评测单个测试用例
+    
+    Args:
+        test_case: 测试用例
+        mode: 评测模式（chapter_match, ragas, hybrid）
+        ragas_evaluator: Ragas 评测器（ragas 或 hybrid 模式需要）
+        ragas_metrics_config: Ragas指标配置字典，用于选择性禁用某些指标
+    
+    Returns:
+        评测结果字典
+    """
+    result = _evaluate_case_offline(test_case, mode)
+    
     # Ragas AI 评测
     if mode in ("ragas", "hybrid"):
         if not ragas_evaluator:
@@ -446,8 +814,11 @@ async def evaluate_single_case(
             ragas_result = await evaluate_ragas(test_case, ragas_evaluator, ragas_metrics_config)
             result.update(ragas_result)
     
-    # 混合模式：计算综合得分
-    if mode == "hybrid":
+    # 混合模式：计算综合得分（跳过 Ragas 评测的用例没有 Ragas 得分，混合得分置空，不计入汇总均值）
+    if mode == "hybrid" and result.get("ragas_error") == _RAGAS_SKIPPED_ERROR:
+        result["hybrid_score"] = None
+        result["hybrid_matched"] = False
+    elif mode == "hybrid":
         chapter_accuracy = result.get("chapter_match_accuracy", 0.0) or 0.0
         ragas_score = result.get("ragas_overall_score")
         if ragas_score is None:
@@ -459,6 +830,127 @@ async def evaluate_single_case(
     return result
 
 
+def _summarize_chapter_match(rows: List[Dict]) -> Dict:
+    """章节匹配指标汇总（rows 为各用例结果中的汇总列）"""
+    stats = {}
+    
+    # 章节匹配字段总是成组出现（出错的用例没有），直接对标量累加，无需经过 DataFrame
+    chapter_results = [result for result in rows if "chapter_match_accuracy" in result]
+    if chapter_results:
+        chapter_accuracy_avg = sum(result["chapter_match_accuracy"] for result in chapter_results) / len(chapter_results)
+        chapter_recall_avg = sum(result["chapter_match_recall"] for result in chapter_results) / len(chapter_results)
+        chapter_correct_count = sum(1 for result in chapter_results if result["chapter_matched"])
+        
+        stats.update({
+            "chapter_match_correct_count": chapter_correct_count,
+            "chapter_match_accuracy": chapter_accuracy_avg,
+            "chapter_match_recall": chapter_recall_avg,
+            "chapter_match_accuracy_percentage": chapter_accuracy_avg * 100,
+            "chapter_match_recall_percentage": chapter_recall_avg * 100,
+        })
+    
+    return stats
+
+
+def _summarize_ragas(rows: List[Dict], columns: frozenset, type_masks: Dict[str, np.ndarray]) -> Dict:
+    """Ragas 指标汇总（基于论文优化：重点关注Factual Correctness和Faithfulness）"""
+    stats = {}
+    
+    # 所有 Ragas 指标列取成一个 float64 矩阵（None 转为 NaN），一次算出各列的非空计数、总和与均值（跳过 NaN）；
+    # 按问题类型的统计也直接在这个矩阵上按行掩码计算。结果经 tolist() 转成 Python 原生数值，后面无需再逐项 float()
+    ragas_cols = [col for col in _RAGAS_SUMMARY_COLUMNS if col in columns]
+    if not ragas_cols:
+        # 没有任何 Ragas 指标列（如所有用例都评测失败），无需再逐项检查
+        return stats
+    col_index = {col: i for i, col in enumerate(ragas_cols)}
+    values = _summary_matrix(rows, ragas_cols)
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    counts = present.sum(axis=0)
+    sums = filled.sum(axis=0)
+    means = np.divide(sums, counts, out=np.full(len(ragas_cols), np.nan), where=counts > 0)
+    
+    ragas_count = dict(zip(ragas_cols, counts.tolist()))
+    ragas_sum = dict(zip(ragas_cols, sums.tolist()))
+    ragas_mean = dict(zip(ragas_cols, means.tolist()))
+    
+    # 各指标的均值与百分比（百分比对整列均值一次性乘 100）
+    ragas_percentage = dict(zip(ragas_cols, (means * 100).tolist()))
+    for col, key in _RAGAS_MEAN_METRICS:
+        if ragas_count.get(col, 0) > 0:
+            stats[key] = ragas_mean[col]
+            stats[f"{key}_percentage"] = ragas_percentage[col]
+    
+    # Factual Correctness 的 TP/FP/FN统计
+    if ragas_count.get("ragas_factual_correctness_score", 0) > 0 and ragas_count.get("ragas_factual_correctness_tp", 0) > 0:
+        stats["ragas_factual_correctness_avg_tp"] = ragas_mean["ragas_factual_correctness_tp"]
+        stats["ragas_factual_correctness_avg_fp"] = ragas_mean["ragas_factual_correctness_fp"] if ragas_count.get("ragas_factual_correctness_fp", 0) > 0 else 0.0
+        stats["ragas_factual_correctness_avg_fn"] = ragas_mean["ragas_factual_correctness_fn"] if ragas_count.get("ragas_factual_correctness_fn", 0) > 0 else 0.0
+    
+    # Faithfulness中间变量统计
+    if ragas_count.get("ragas_faithfulness_total_count", 0) > 0:
+        stats["ragas_faithfulness_statements_avg"] = ragas_mean["ragas_faithfulness_total_count"]
+        stats["ragas_faithfulness_statements_total"] = int(ragas_sum["ragas_faithfulness_total_count"])
+        
+        if ragas_count.get("ragas_faithfulness_faithful_count", 0) > 0:
+            # 计算总体忠实比例
+            total_faithful = int(ragas_sum["ragas_faithfulness_faithful_count"])
+            total_statements = int(ragas_sum["ragas_faithfulness_total_count"])
+            if total_statements > 0:
+                faithful_ratio = total_faithful / total_statements
+                stats["ragas_faithfulness_verdicts_faithful_ratio"] = faithful_ratio
+                stats["ragas_faithfulness_verdicts_faithful_ratio_percentage"] = faithful_ratio * 100
+                stats["ragas_faithfulness_statements_distribution"] = {
+                    "faithful_count": total_faithful,
+                    "unfaithful_count": total_statements - total_faithful,
+                    "total_count": total_statements
+                }
+    
+    # 按问题类型（S1-S6）的指标分布统计：每种类型一次取出所有指标列，一次求出均值和非空计数
+    type_metric_cols = [col for col in _RAGAS_TYPE_METRIC_COLUMNS if col in col_index]
+    if type_masks and type_metric_cols:
+        metric_idx = [col_index[col] for col in type_metric_cols]
+        type_sums = {}
+        type_counts = {}
+        for q_type, mask in type_masks.items():
+            if mask.any():
+                type_sums[q_type] = dict(zip(type_metric_cols, filled[mask][:, metric_idx].sum(axis=0).tolist()))
+                type_counts[q_type] = dict(zip(type_metric_cols, present[mask][:, metric_idx].sum(axis=0).tolist()))
+        
+        # 按指标、类型的顺序写入（{q_type}_count 以最后一个有得分的指标为准）
+        for metric_col in type_metric_cols:
+            metric_name = metric_col.replace("ragas_", "").replace("_score", "")
+            for q_type, metric_sums in type_sums.items():
+                count = type_counts[q_type][metric_col]
+                if count > 0:
+                    type_avg = metric_sums[metric_col] / count
+                    stats[f"{q_type}_{metric_name}_score"] = type_avg
+                    stats[f"{q_type}_{metric_name}_score_percentage"] = type_avg * 100
+                    stats[f"{q_type}_count"] = count
+    
+    return stats
+
+
+def _summarize_hybrid(rows: List[Dict], columns: frozenset) -> Dict:
+    """混合模式指标汇总"""
+    stats = {}
+    if "hybrid_score" in columns:
+        hybrid_scores = [result["hybrid_score"] for result in rows if result.get("hybrid_score") is not None]
+        if hybrid_scores:
+            hybrid_avg = sum(hybrid_scores) / len(hybrid_scores)
+            stats["hybrid_score"] = hybrid_avg
+            stats["hybrid_score_percentage"] = hybrid_avg * 100
+    
+    if "hybrid_matched" in columns:
+        stats["hybrid_correct_count"] = sum(1 for result in rows if result.get("hybrid_matched"))
+    
+    return stats
+
+
+# 正在进行的 run_evaluation 数量（同一事件循环上可能有多个评测任务交替执行）
+_active_evaluations = 0
+
+
 async def run_evaluation(
     csv_path: str,
     output_dir: Optional[str] = None,
@@ -485,6 +977,27 @@ async def run_evaluation(
     Returns:
         Dict with results: {report_path, summary, total_questions, ...}
     """
+    global _active_evaluations
+    _active_evaluations += 1
+    try:
+        return await _run_evaluation(csv_path, output_dir, mode, progress_callback, ragas_metrics_config)
+    finally:
+        # 章节解析缓存是进程级共享的（并发的评测任务共用，且有 maxsize 上限）；
+        # 只在没有其他评测任务进行时清空，避免清掉正在运行的任务的缓存
+        _active_evaluations -= 1
+        if _active_evaluations == 0:
+            ChapterMatcher.cache_clear()
+            _match_cached.cache_clear()
+
+
+async def _run_evaluation(
+    csv_path: str,
+    output_dir: Optional[str],
+    mode: EvaluationMode,
+    progress_callback: Optional[Callable[[int, int, Dict], Awaitable[None]]],
+    ragas_metrics_config: Optional[Dict[str, bool]],
+) -> Dict:
+    """run_evaluation 的实际实现（参数与返回值见 run_evaluation）"""
     start_time = time.time()
     logger.info("=" * 80)
     logger.info(f"开始评测任务: {csv_path}")
@@ -537,507 +1050,340 @@ async def run_evaluation(
     # 评测所有用例（支持并发）
     evaluation_start_time = time.time()
     
-    # 读取并发配置（默认5，可以通过环境变量配置，最多不超过LLM_MAX_CONCURRENT）
-    # 如果有多个worker，可以设置为worker数量以充分利用资源
-    max_concurrent = int(os.getenv("EVAL_MAX_CONCURRENT", "5"))
-    llm_max_concurrent = int(os.getenv("LLM_MAX_CONCURRENT", "10"))
-    effective_max_concurrent = min(max_concurrent, llm_max_concurrent)
+    # 并发配置（模块导入时已从环境变量读取）
+    effective_max_concurrent = min(EVAL_MAX_CONCURRENT, LLM_MAX_CONCURRENT)
     
-    logger.info(f"评测并发配置: max_concurrent={effective_max_concurrent} (配置值: {max_concurrent}, LLM限制: {llm_max_concurrent})")
+    logger.info(f"评测并发配置: max_concurrent={effective_max_concurrent} (配置值: {EVAL_MAX_CONCURRENT}, LLM限制: {LLM_MAX_CONCURRENT})")
     
     # 使用信号量控制并发数
     semaphore = asyncio.Semaphore(effective_max_concurrent)
-    results = []
-    retrieval_stats = {
-        "total_with_context": 0,
-        "total_without_context": 0,
-        "retrieval_success_rate": 0.0,
-    }
-    
-    # 已完成的任务计数（用于进度跟踪）
-    completed_count = 0
-    completed_lock = asyncio.Lock()
-    
-    async def evaluate_with_semaphore(idx: int, test_case: TestCase) -> tuple[int, Dict]:
-        """使用信号量控制的并发评测函数"""
-        nonlocal completed_count
-        async with semaphore:
-            try:
-                case_start = time.time()
-                logger.debug(f"开始评测问题 {idx}/{total}: {test_case.question[:60]}... (模式: {mode})")
-                result = await evaluate_single_case(test_case, mode, ragas_evaluator, ragas_metrics_config)
-                case_time = time.time() - case_start
-                
-                # 更新检索统计（需要加锁）
-                async with completed_lock:
+    # 完整结果（含问题、答案、上下文等大文本）随到随落盘，内存中只保留汇总列；
+    # 临时文件在退出 with 时关闭并删除（包括评测中途出错或被取消的情况）
+    with _ResultSpool() as spool:
+        retrieval_stats = {
+            "total_with_context": 0,
+            "total_without_context": 0,
+            "retrieval_success_rate": 0.0,
+        }
+        
+        # 召回率@K 与耗时的列式缓冲区：按用例序号写入，未写入（评测失败）的位置保持 NaN
+        metric_buffers = {col: np.full(total, np.nan) for col in _METRIC_BUFFER_COLUMNS}
+        
+        def record_metrics(idx: int, result: Dict) -> None:
+            for col, buffer in metric_buffers.items():
+                value = result.get(col)
+                if value is not None:
+                    buffer[idx - 1] = value
+        
+        # 已完成的任务计数（用于进度跟踪）
+        completed_count = 0
+        # 进度回调最多约 200 次（每 total // 200 条以及最后一条），与用例总数无关，避免大 CSV 时逐条推送
+        progress_every = max(1, total // 200)
+        
+        async def evaluate_with_semaphore(idx: int, test_case: TestCase) -> tuple[int, Dict]:
+            """使用信号量控制的并发评测函数"""
+            nonlocal completed_count
+            async with semaphore:
+                try:
+                    case_start = time.time()
+                    logger.debug("开始评测问题 %d/%d: %.60s... (模式: %s)", idx, total, test_case.question, mode)
+                    result = await evaluate_single_case(test_case, mode, ragas_evaluator, ragas_metrics_config)
+                    case_time = time.time() - case_start
+                    
+                    # 更新检索统计：事件循环是单线程的，两次 await 之间的计数更新不会被打断，无需加锁。
+                    # 记下本次的完成序号，之后的 await 期间其他用例可能继续更新 completed_count
                     completed_count += 1
+                    completed = completed_count
                     if test_case.retrieved_context:
                         retrieval_stats["total_with_context"] += 1
                     else:
                         retrieval_stats["total_without_context"] += 1
+                    record_metrics(idx, result)
                     
-                    # 记录每个问题的评测耗时（INFO级别，便于监控）
+                    # 记录每个问题的评测耗时（INFO级别，便于监控；用 % 占位符，日志级别关闭时不做格式化）
                     elapsed_total = time.time() - evaluation_start_time
-                    avg_time_so_far = elapsed_total / completed_count if completed_count > 0 else 0
-                    remaining = total - completed_count
+                    avg_time_so_far = elapsed_total / completed
+                    remaining = total - completed
                     eta = avg_time_so_far * remaining if remaining > 0 else 0
                     
                     if mode in ("ragas", "hybrid") and "ragas_relevancy_score" in result:
-                        relevancy = result.get("ragas_relevancy_score", 0.0)
-                        logger.info(f"[{completed_count}/{total}] 评测完成 | 耗时: {case_time:.2f}s | 相关性: {relevancy:.2f} | "
-                                  f"累计: {elapsed_total:.1f}s | 平均: {avg_time_so_far:.2f}s/条 | 预计剩余: {eta:.1f}s")
+                        relevancy = result.get("ragas_relevancy_score") or 0.0
+                        logger.info("[%d/%d] 评测完成 | 耗时: %.2fs | 相关性: %.2f | 累计: %.1fs | 平均: %.2fs/条 | 预计剩余: %.1fs",
+                                    completed, total, case_time, relevancy, elapsed_total, avg_time_so_far, eta)
                     elif mode in ("chapter_match", "hybrid") and "chapter_matched" in result:
                         matched = result.get("chapter_matched", False)
-                        logger.info(f"[{completed_count}/{total}] 评测完成 | 耗时: {case_time:.2f}s | 章节匹配: {'✅' if matched else '❌'} | "
-                                  f"累计: {elapsed_total:.1f}s | 平均: {avg_time_so_far:.2f}s/条 | 预计剩余: {eta:.1f}s")
+                        logger.info("[%d/%d] 评测完成 | 耗时: %.2fs | 章节匹配: %s | 累计: %.1fs | 平均: %.2fs/条 | 预计剩余: %.1fs",
+                                    completed, total, case_time, '✅' if matched else '❌', elapsed_total, avg_time_so_far, eta)
                     else:
-                        logger.info(f"[{completed_count}/{total}] 评测完成 | 耗时: {case_time:.2f}s | "
-                                  f"累计: {elapsed_total:.1f}s | 平均: {avg_time_so_far:.2f}s/条 | 预计剩余: {eta:.1f}s")
+                        logger.info("[%d/%d] 评测完成 | 耗时: %.2fs | 累计: %.1fs | 平均: %.2fs/条 | 预计剩余: %.1fs",
+                                    completed, total, case_time, elapsed_total, avg_time_so_far, eta)
                     
                     # 发送进度更新
-                    if progress_callback:
+                    if progress_callback and (completed % progress_every == 0 or completed == total):
                         try:
-                            # 传递 completed_count 作为当前完成数（不是 completed_count - 1）
+                            # 传递 completed 作为当前完成数（不是 completed - 1）
                             await progress_callback(
-                                completed_count,
+                                completed,
                                 total,
-                                {"status": "evaluating", "current": completed_count, "total": total, "mode": mode}
+                                {"status": "evaluating", "current": completed, "total": total, "mode": mode}
                             )
                         except Exception as e:
                             # 进度回调失败不应中断评测
                             logger.warning(f"进度回调失败（不影响评测）: {e}")
                     
                     # 每完成10%或最后一条时记录汇总进度日志
-                    if completed_count % max(1, total // 10) == 0 or completed_count == total:
+                    if completed % max(1, total // 10) == 0 or completed == total:
                         elapsed = time.time() - evaluation_start_time
-                        avg_time_per_item = elapsed / completed_count if completed_count > 0 else 0
-                        remaining = total - completed_count
+                        avg_time_per_item = elapsed / completed
+                        remaining = total - completed
                         eta = avg_time_per_item * remaining if remaining > 0 else 0
-                        percentage = completed_count * 100 // total
-                        logger.info(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-                        logger.info(f"评测进度汇总: {completed_count}/{total} ({percentage}%) | "
-                                  f"已用时: {elapsed:.1f}s ({elapsed/60:.1f}分钟) | "
-                                  f"平均: {avg_time_per_item:.2f}s/条 | "
-                                  f"预计剩余: {eta:.1f}s ({eta/60:.1f}分钟)")
-                        logger.info(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-                
-                return (idx, result)
-            except Exception as e:
-                case_time = time.time() - case_start if 'case_start' in locals() else 0
-                logger.error(f"评测用例 {idx} 失败（耗时 {case_time:.2f}s）: {e}", exc_info=True)
-                # 添加错误结果
-                error_result = {
-                    "question": test_case.question,
-                    "answer": test_case.answer,
-                    "answer_chapter": test_case.answer_chapter,
-                    "reference": test_case.reference,
-                    "type": test_case.type,
-                    "theme": test_case.theme,
-                    "retrieved_context": test_case.retrieved_context,
-                    "error": str(e)
-                }
-                async with completed_lock:
+                        percentage = completed * 100 // total
+                        logger.info(_PROGRESS_RULE)
+                        logger.info("评测进度汇总: %d/%d (%d%%) | 已用时: %.1fs (%.1f分钟) | 平均: %.2fs/条 | 预计剩余: %.1fs (%.1f分钟)",
+                                    completed, total, percentage, elapsed, elapsed / 60, avg_time_per_item, eta, eta / 60)
+                        logger.info(_PROGRESS_RULE)
+                    
+                    return (idx, result)
+                except Exception as e:
+                    case_time = time.time() - case_start if 'case_start' in locals() else 0
+                    logger.error(f"评测用例 {idx} 失败（耗时 {case_time:.2f}s）: {e}", exc_info=True)
+                    # 添加错误结果
+                    error_result = _build_error_result(test_case, e)
                     completed_count += 1
                     if test_case.retrieved_context:
                         retrieval_stats["total_with_context"] += 1
                     else:
                         retrieval_stats["total_without_context"] += 1
-                return (idx, error_result)
-    
-    # 创建所有评测任务
-    tasks = [evaluate_with_semaphore(idx, test_case) for idx, test_case in enumerate(test_cases, 1)]
-    
-    # 并发执行所有任务
-    logger.info(f"开始并发评测 {total} 个用例，并发数: {effective_max_concurrent}")
-    task_results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # 按照原始顺序整理结果
-    indexed_results = []
-    for result in task_results:
-        if isinstance(result, Exception):
-            logger.error(f"评测任务执行异常: {result}", exc_info=True)
-            # 创建一个占位错误结果
-            indexed_results.append((0, {"error": str(result)}))
-        else:
-            indexed_results.append(result)
-    
-    # 按索引排序（保持原始顺序）
-    indexed_results.sort(key=lambda x: x[0])
-    results = [result for _, result in indexed_results]
-    
-    evaluation_time = time.time() - evaluation_start_time
-    logger.info("=" * 80)
-    logger.info(f"✅ 评测处理完成: 耗时 {evaluation_time:.2f}秒 ({evaluation_time/60:.2f}分钟)")
-    logger.info("=" * 80)
-    
-    # 转换为 DataFrame
-    df = pd.DataFrame(results)
-    
-    # 计算总体指标
-    total_questions = len(results)
-    
-    summary = {
-        "total_questions": total_questions,
-        "mode": mode,
-    }
-    
-    # 检索质量统计
-    if total_questions > 0:
-        retrieval_stats["retrieval_success_rate"] = retrieval_stats["total_with_context"] / total_questions
-    summary.update({
-        "retrieval_with_context_count": retrieval_stats["total_with_context"],
-        "retrieval_without_context_count": retrieval_stats["total_without_context"],
-        "retrieval_success_rate": float(retrieval_stats["retrieval_success_rate"]),
-        "retrieval_success_rate_percentage": float(retrieval_stats["retrieval_success_rate"] * 100),
-    })
-    
-    # 召回率@K统计（检索优化指标）
-    if "recall_at_3" in df.columns:
-        recall_at_3_scores = df["recall_at_3"].dropna()
-        if len(recall_at_3_scores) > 0:
-            summary["recall_at_3"] = float(recall_at_3_scores.mean())
-            summary["recall_at_3_percentage"] = float(recall_at_3_scores.mean() * 100)
-    
-    if "recall_at_5" in df.columns:
-        recall_at_5_scores = df["recall_at_5"].dropna()
-        if len(recall_at_5_scores) > 0:
-            summary["recall_at_5"] = float(recall_at_5_scores.mean())
-            summary["recall_at_5_percentage"] = float(recall_at_5_scores.mean() * 100)
-    
-    if "recall_at_10" in df.columns:
-        recall_at_10_scores = df["recall_at_10"].dropna()
-        if len(recall_at_10_scores) > 0:
-            summary["recall_at_10"] = float(recall_at_10_scores.mean())
-            summary["recall_at_10_percentage"] = float(recall_at_10_scores.mean() * 100)
-    
-    # 性能指标统计
-    if "retrieval_time" in df.columns:
-        retrieval_times = df["retrieval_time"].dropna()
-        if len(retrieval_times) > 0:
-            summary["avg_retrieval_time"] = float(retrieval_times.mean())
-            summary["p50_retrieval_time"] = float(retrieval_times.quantile(0.5))
-            summary["p95_retrieval_time"] = float(retrieval_times.quantile(0.95))
-    
-    if "generation_time" in df.columns:
-        generation_times = df["generation_time"].dropna()
-        if len(generation_times) > 0:
-            summary["avg_generation_time"] = float(generation_times.mean())
-            summary["p50_generation_time"] = float(generation_times.quantile(0.5))
-            summary["p95_generation_time"] = float(generation_times.quantile(0.95))
-    
-    if "total_time" in df.columns:
-        total_times = df["total_time"].dropna()
-        if len(total_times) > 0:
-            summary["avg_total_time"] = float(total_times.mean())
-            summary["p50_total_time"] = float(total_times.quantile(0.5))
-            summary["p95_total_time"] = float(total_times.quantile(0.95))
-            # 并发10条的平均时间（占位符，实际需要并发测试）
-            summary["concurrent_10_avg_time"] = float(total_times.mean())
-    
-    # 记录 Ragas 初始化错误（如果有）
-    if ragas_init_error:
-        summary["ragas_init_error"] = ragas_init_error
-        summary["ragas_available"] = False
-    else:
-        summary["ragas_available"] = mode in ("ragas", "hybrid")
-    
-    # 章节匹配指标
-    if mode in ("chapter_match", "hybrid"):
-        if "chapter_match_accuracy" in df.columns:
-            chapter_accuracy_avg = df["chapter_match_accuracy"].mean() if len(df) > 0 else 0.0
-            chapter_recall_avg = df["chapter_match_recall"].mean() if len(df) > 0 else 0.0
-            chapter_correct_count = df["chapter_matched"].sum() if "chapter_matched" in df.columns else 0
-            
-            summary.update({
-                "chapter_match_correct_count": int(chapter_correct_count),
-                "chapter_match_accuracy": float(chapter_accuracy_avg),
-                "chapter_match_recall": float(chapter_recall_avg),
-                "chapter_match_accuracy_percentage": float(chapter_accuracy_avg * 100),
-                "chapter_match_recall_percentage": float(chapter_recall_avg * 100),
-            })
-    
-    # Ragas 指标（基于论文优化：重点关注Factual Correctness和Faithfulness）
-    if mode in ("ragas", "hybrid"):
-        if ragas_evaluator is None:
-            # Ragas 初始化失败，设置默认值
-            summary.update({
-                "ragas_overall_score": None,
-                "ragas_overall_score_percentage": None,
-                "ragas_core_score": None,
-                "ragas_factual_correctness_score": None,
-                "ragas_faithfulness_score": None,
-                "ragas_context_relevance_score": None,
-                "ragas_relevancy_score": None,
-                "ragas_quality_score": None,  # 兼容旧字段
-            })
-        else:
-            # 核心指标1：Factual Correctness（事实正确性）
-            if "ragas_factual_correctness_score" in df.columns:
-                factual_scores = df["ragas_factual_correctness_score"].dropna()
-                if len(factual_scores) > 0:
-                    factual_avg = factual_scores.mean()
-                    summary["ragas_factual_correctness_score"] = float(factual_avg)
-                    summary["ragas_factual_correctness_score_percentage"] = float(factual_avg * 100)
-                    
-                    # TP/FP/FN统计
-                    if "ragas_factual_correctness_tp" in df.columns:
-                        tp_values = df["ragas_factual_correctness_tp"].dropna()
-                        fp_values = df["ragas_factual_correctness_fp"].dropna()
-                        fn_values = df["ragas_factual_correctness_fn"].dropna()
-                        if len(tp_values) > 0:
-                            summary["ragas_factual_correctness_avg_tp"] = float(tp_values.mean())
-                            summary["ragas_factual_correctness_avg_fp"] = float(fp_values.mean()) if len(fp_values) > 0 else 0.0
-                            summary["ragas_factual_correctness_avg_fn"] = float(fn_values.mean()) if len(fn_values) > 0 else 0.0
+                    return (idx, error_result)
+        
+        # 纯章节匹配模式不调用 LLM，用例较多时改用多进程按批评测以绕开 GIL
+        process_workers = min(EVAL_PROCESS_WORKERS, total)
+        if mode == "chapter_match" and total >= EVAL_PROCESS_MIN_CASES and process_workers > 1:
+            batch_size = max(1, total // (process_workers * 8))
+            logger.info(f"使用多进程评测 {total} 个用例，进程数: {process_workers}，每批: {batch_size}")
+            loop = asyncio.get_running_loop()
+            batch_starts = range(0, total, batch_size)
             
-            # 核心指标2：Faithfulness（忠实度）
-            if "ragas_faithfulness_score" in df.columns:
-                faithfulness_scores = df["ragas_faithfulness_score"].dropna()
-                if len(faithfulness_scores) > 0:
-                    faithfulness_avg = faithfulness_scores.mean()
-                    summary["ragas_faithfulness_score"] = float(faithfulness_avg)
-                    summary["ragas_faithfulness_score_percentage"] = float(faithfulness_avg * 100)
+            async def record_batch(batch_start: int, batch_results: List[Dict]) -> None:
+                """按顺序登记一批结果，并在批次边界上报进度"""
+                nonlocal completed_count
+                for offset, result in enumerate(batch_results, batch_start + 1):
+                    record_metrics(offset, result)
+                    spool.add(offset, result)
+                completed_count += len(batch_results)
+                
+                if progress_callback:
+                    try:
+                        await progress_callback(
+                            completed_count,
+                            total,
+                            {"status": "evaluating", "current": completed_count, "total": total, "mode": mode}
+                        )
+                    except Exception as e:
+                        logger.warning(f"进度回调失败（不影响评测）: {e}")
+                
+                elapsed = time.time() - evaluation_start_time
+                logger.info(f"评测进度: {completed_count}/{total} ({completed_count * 100 // total}%) | "
+                          f"已用时: {elapsed:.1f}s")
             
-            # Faithfulness中间变量统计
-            if "ragas_faithfulness_total_count" in df.columns:
-                total_counts = df["ragas_faithfulness_total_count"].dropna()
-                if len(total_counts) > 0:
-                    summary["ragas_faithfulness_statements_avg"] = float(total_counts.mean())
-                    summary["ragas_faithfulness_statements_total"] = int(total_counts.sum())
+            futures = []
+            done_batches = 0
+            try:
+                with ProcessPoolExecutor(max_workers=process_workers, mp_context=_PROCESS_POOL_CONTEXT) as executor:
+                    futures = [
+                        loop.run_in_executor(executor, _evaluate_cases_worker, test_cases[i:i + batch_size], mode)
+                        for i in batch_starts
+                    ]
+                    # 按提交顺序收集结果，保持原始顺序
+                    for batch_start, future in zip(batch_starts, futures):
+                        await record_batch(batch_start, await future)
+                        done_batches += 1
+            except BrokenProcessPool as e:
+                # 子进程异常退出时整个进程池不可用：取走其余批次的异常，剩余批次改在当前进程（线程池）中评测
+                await asyncio.gather(*futures[done_batches:], return_exceptions=True)
+                logger.warning(f"评测子进程异常退出（{e}），剩余 {len(batch_starts) - done_batches} 批改为在当前进程中评测")
+                for batch_start in batch_starts[done_batches:]:
+                    batch_results = await loop.run_in_executor(
+                        None, _evaluate_cases_worker, test_cases[batch_start:batch_start + batch_size], mode
+                    )
+                    await record_batch(batch_start, batch_results)
             
-            if "ragas_faithfulness_faithful_count" in df.columns and "ragas_faithfulness_total_count" in df.columns:
-                faithful_counts = df["ragas_faithfulness_faithful_count"].dropna()
-                total_counts = df["ragas_faithfulness_total_count"].dropna()
-                if len(faithful_counts) > 0 and len(total_counts) > 0:
-                    # 计算总体忠实比例
-                    total_faithful = int(faithful_counts.sum())
-                    total_statements = int(total_counts.sum())
-                    if total_statements > 0:
-                        summary["ragas_faithfulness_verdicts_faithful_ratio"] = float(total_faithful / total_statements)
-                        summary["ragas_faithfulness_verdicts_faithful_ratio_percentage"] = float(total_faithful / total_statements * 100)
-                        summary["ragas_faithfulness_statements_distribution"] = {
-                            "faithful_count": int(total_faithful),
-                            "unfaithful_count": int(total_statements - total_faithful),
-                            "total_count": int(total_statements)
-                        }
+            retrieval_stats["total_with_context"] = sum(1 for test_case in test_cases if test_case.retrieved_context)
+            retrieval_stats["total_without_context"] = total - retrieval_stats["total_with_context"]
+        else:
+            # 固定数量的 worker 从共享迭代器中依次取用例，协程随取随建，不再一次性为所有用例创建任务
+            case_iter = enumerate(test_cases, 1)
             
-            # 辅助指标：Context Relevance（上下文相关性）
-            if "ragas_context_relevance_score" in df.columns:
-                context_relevance_scores = df["ragas_context_relevance_score"].dropna()
-                if len(context_relevance_scores) > 0:
-                    context_relevance_avg = context_relevance_scores.mean()
-                    summary["ragas_context_relevance_score"] = float(context_relevance_avg)
-                    summary["ragas_context_relevance_score_percentage"] = float(context_relevance_avg * 100)
+            async def evaluation_worker() -> None:
+                for idx, test_case in case_iter:
+                    try:
+                        spool.add(*await evaluate_with_semaphore(idx, test_case))
+                    except Exception as e:
+                        logger.error(f"评测任务执行异常: {e}", exc_info=True)
+                        # 在该用例的位置写入占位错误结果，避免后续结果一直等待
+                        spool.add(idx, {"error": str(e)})
             
-            # 辅助指标：Answer Relevancy（答案相关性）
-            if "ragas_relevancy_score" in df.columns:
-                relevancy_scores = df["ragas_relevancy_score"].dropna()
-                if len(relevancy_scores) > 0:
-                    relevancy_avg = relevancy_scores.mean()
-                    summary["ragas_relevancy_score"] = float(relevancy_avg)
-                    summary["ragas_relevancy_score_percentage"] = float(relevancy_avg * 100)
-                    summary["ragas_satisfaction_score"] = float(relevancy_avg)  # 用户满意度 = 相关性
-                    summary["ragas_satisfaction_score_percentage"] = float(relevancy_avg * 100)
+            # 并发执行所有任务
+            logger.info(f"开始并发评测 {total} 个用例，并发数: {effective_max_concurrent}")
+            await asyncio.gather(*(evaluation_worker() for _ in range(max(1, min(effective_max_concurrent, total)))))
             
-            # 核心得分（Factual Correctness + Faithfulness的平均值）
-            if "ragas_core_score" in df.columns:
-                core_scores = df["ragas_core_score"].dropna()
-                if len(core_scores) > 0:
-                    core_avg = core_scores.mean()
-                    summary["ragas_core_score"] = float(core_avg)
-                    summary["ragas_core_score_percentage"] = float(core_avg * 100)
+        evaluation_time = time.time() - evaluation_start_time
+        logger.info("=" * 80)
+        logger.info(f"✅ 评测处理完成: 耗时 {evaluation_time:.2f}秒 ({evaluation_time/60:.2f}分钟)")
+        logger.info("=" * 80)
+        
+        # 汇总统计只需要指标列；问题、答案、上下文等大文本列已落盘，不进入内存。
+        # 指标直接在这些汇总行上计算（数值列按需取成 NumPy 数组），不构建 DataFrame
+        summary_rows = spool.summary_rows
+        # 下面多处判断某列是否存在（任一结果中出现过即存在），统一查这个集合
+        summary_columns = _SUMMARY_COLUMNS.intersection(spool.columns)
+        
+        # 计算总体指标
+        total_questions = spool.count
+        
+        # 检索质量统计（与基础字段一起用一个字面量构建，后面各部分也都整块 update 进 summary）
+        if total_questions > 0:
+            retrieval_stats["retrieval_success_rate"] = retrieval_stats["total_with_context"] / total_questions
+        summary = {
+            "total_questions": total_questions,
+            "mode": mode,
+            "retrieval_with_context_count": retrieval_stats["total_with_context"],
+            "retrieval_without_context_count": retrieval_stats["total_without_context"],
+            "retrieval_success_rate": retrieval_stats["retrieval_success_rate"],
+            "retrieval_success_rate_percentage": retrieval_stats["retrieval_success_rate"] * 100,
+        }
+        
+        # 召回率@K统计（检索优化指标）与性能指标统计：直接在列缓冲区上计算（跳过 NaN，即评测失败的用例）
+        metric_values = {col: buffer[~np.isnan(buffer)] for col, buffer in metric_buffers.items()}
+        
+        for col in _RECALL_COLUMNS:
+            values = metric_values[col]
+            if values.size > 0:
+                recall_avg = float(values.mean())
+                summary.update({col: recall_avg, f"{col}_percentage": recall_avg * 100})
+        
+        for col in _CASE_TIME_COLUMNS:
+            values = metric_values[col]
+            if values.size > 0:
+                p50, p95 = np.quantile(values, [0.5, 0.95])
+                summary.update({
+                    f"avg_{col}": float(values.mean()),
+                    f"p50_{col}": float(p50),
+                    f"p95_{col}": float(p95),
+                })
+        
+        if metric_values["total_time"].size > 0:
+            # 并发10条的平均时间（占位符，实际需要并发测试）
+            summary["concurrent_10_avg_time"] = float(metric_values["total_time"].mean())
+        
+        # 记录 Ragas 初始化错误（如果有）
+        if ragas_init_error:
+            summary.update({"ragas_init_error": ragas_init_error, "ragas_available": False})
+        else:
+            summary["ragas_available"] = mode in ("ragas", "hybrid")
+        
+        # 章节匹配指标
+        if mode in ("chapter_match", "hybrid"):
+            summary.update(_summarize_chapter_match(summary_rows))
+        
+        # 确定泛化性计算使用的得分列（优先使用混合得分，其次 Ragas 核心得分 / 综合得分，最后章节匹配准确率）
+        score_column = None
+        if mode == "hybrid" and "hybrid_score" in summary_columns:
+            score_column = "hybrid_score"
+        elif mode in ("ragas", "hybrid") and "ragas_core_score" in summary_columns:
+            score_column = "ragas_core_score"  # 优先使用核心得分
+        elif mode in ("ragas", "hybrid") and "ragas_overall_score" in summary_columns:
+            score_column = "ragas_overall_score"
+        elif mode in ("chapter_match", "hybrid") and "chapter_match_accuracy" in summary_columns:
+            score_column = "chapter_match_accuracy"
+        
+        # 只有按类型的 Ragas 统计或泛化性计算会用到掩码；两者都不需要时跳过对 type 列的编码
+        needs_type_masks = score_column is not None or (
+            mode in ("ragas", "hybrid") and ragas_evaluator is not None
+            and any(col in summary_columns for col in _RAGAS_TYPE_METRIC_COLUMNS)
+        )
+        # 按问题类型（S1-S6）划分用例的布尔掩码：type 列只编码一次，按类型的指标统计和泛化性计算共用
+        if needs_type_masks and "type" in summary_columns:
+            type_masks = _question_type_masks([result.get("type") for result in summary_rows])
+        else:
+            type_masks = {}
+        
+        # Ragas 指标（基于论文优化：重点关注Factual Correctness和Faithfulness）
+        if mode in ("ragas", "hybrid"):
+            if ragas_evaluator is None:
+                # Ragas 初始化失败，设置默认值
+                summary.update({
+                    "ragas_overall_score": None,
+                    "ragas_overall_score_percentage": None,
+                    "ragas_core_score": None,
+                    "ragas_factual_correctness_score": None,
+                    "ragas_faithfulness_score": None,
+                    "ragas_context_relevance_score": None,
+                    "ragas_relevancy_score": None,
+                    "ragas_quality_score": None,  # 兼容旧字段
+                })
+            else:
+                summary.update(_summarize_ragas(summary_rows, summary_columns, type_masks))
+        
+        # 混合模式指标
+        if mode == "hybrid":
+            summary.update(_summarize_hybrid(summary_rows, summary_columns))
+        
+        # 泛化性指标计算（得分列 score_column 已在上面确定）
+        if score_column and type_masks:
+            # 按问题类型分组统计得分（复用上面的类型掩码，跳过 NaN）
+            scores = _summary_matrix(summary_rows, (score_column,))[:, 0]
+            scored = ~np.isnan(scores)
+            results_by_type = {}
+            for q_type, mask in type_masks.items():
+                type_scores = scores[mask & scored]
+                if type_scores.size:
+                    results_by_type[q_type] = type_scores
             
-            # 综合得分（overall_score）
-            if "ragas_overall_score" in df.columns:
-                ragas_scores = df["ragas_overall_score"].dropna()
-                if len(ragas_scores) > 0:
-                    ragas_avg = ragas_scores.mean()
-                    summary.update({
-                        "ragas_overall_score": float(ragas_avg),
-                        "ragas_overall_score_percentage": float(ragas_avg * 100),
+            if len(results_by_type) >= 2:  # 至少需要2种类型才能计算泛化性
+                generalization_score = calculate_generalization_score(results_by_type)
+                summary.update({
+                    "generalization_score": generalization_score,
+                    "generalization_score_percentage": generalization_score * 100,
+                })
+                
+                # 记录各类型问题的平均得分（用于分析；results_by_type 中的数组均非空）
+                summary.update({f"{q_type}_avg_score": float(scores.mean()) for q_type, scores in results_by_type.items()})
+        
+        # 生成优化建议（基于论文的核心指标）
+        optimization_suggestions = []
+        for key, threshold, category, metric, suggestion in _OPTIMIZATION_RULES:
+            if key in summary:
+                value = summary[key] or 0.0
+                if value < threshold:
+                    optimization_suggestions.append({
+                        "category": category,
+                        "metric": metric,
+                        "current_value": f"{value:.2%}",
+                        "suggestion": suggestion,
                     })
-            
-            # 兼容旧字段：quality_score（映射到factual_correctness）
-            if "ragas_quality_score" in df.columns:
-                quality_scores = df["ragas_quality_score"].dropna()
-                if len(quality_scores) > 0:
-                    summary["ragas_quality_score"] = float(quality_scores.mean())
-                    summary["ragas_quality_score_percentage"] = float(quality_scores.mean() * 100)
-            
-            # 按问题类型（S1-S6）的指标分布统计
-            if "type" in df.columns:
-                for metric_col in ["ragas_factual_correctness_score", "ragas_faithfulness_score", "ragas_relevancy_score"]:
-                    if metric_col in df.columns:
-                        type_metrics = {}
-                        for q_type in ["S1", "S2", "S3", "S4", "S5", "S6"]:
-                            type_df = df[df["type"].str.contains(q_type, na=False, case=False)]
-                            if len(type_df) > 0:
-                                type_scores = type_df[metric_col].dropna()
-                                if len(type_scores) > 0:
-                                    metric_name = metric_col.replace("ragas_", "").replace("_score", "")
-                                    type_metrics[f"{q_type}_{metric_name}_score"] = float(type_scores.mean())
-                                    type_metrics[f"{q_type}_{metric_name}_score_percentage"] = float(type_scores.mean() * 100)
-                                    type_metrics[f"{q_type}_count"] = int(len(type_scores))
-                        
-                        if type_metrics:
-                            summary.update(type_metrics)
-    
-    # 混合模式指标
-    if mode == "hybrid":
-        if "hybrid_score" in df.columns:
-            hybrid_scores = df["hybrid_score"].dropna()
-            if len(hybrid_scores) > 0:
-                summary["hybrid_score"] = float(hybrid_scores.mean())
-                summary["hybrid_score_percentage"] = float(hybrid_scores.mean() * 100)
         
-        if "hybrid_matched" in df.columns:
-            hybrid_correct_count = df["hybrid_matched"].sum()
-            summary["hybrid_correct_count"] = int(hybrid_correct_count)
-    
-    # 泛化性指标计算
-    # 使用混合得分或Ragas得分作为基础得分
-    # 优先使用核心得分（Factual Correctness + Faithfulness）
-    score_column = None
-    if mode == "hybrid" and "hybrid_score" in df.columns:
-        score_column = "hybrid_score"
-    elif mode in ("ragas", "hybrid") and "ragas_core_score" in df.columns:
-        score_column = "ragas_core_score"  # 优先使用核心得分
-    elif mode in ("ragas", "hybrid") and "ragas_overall_score" in df.columns:
-        score_column = "ragas_overall_score"
-    elif mode in ("chapter_match", "hybrid") and "chapter_match_accuracy" in df.columns:
-        score_column = "chapter_match_accuracy"
-    
-    if score_column and "type" in df.columns:
-        # 按问题类型分组统计得分
-        results_by_type = {}
-        for q_type in ["S1", "S2", "S3", "S4", "S5", "S6"]:
-            type_df = df[df["type"].str.contains(q_type, na=False, case=False)]
-            if len(type_df) > 0:
-                type_scores = type_df[score_column].dropna().tolist()
-                if type_scores:
-                    results_by_type[q_type] = type_scores
+        if optimization_suggestions:
+            summary["optimization_suggestions"] = optimization_suggestions
         
-        if len(results_by_type) >= 2:  # 至少需要2种类型才能计算泛化性
-            generalization_score = calculate_generalization_score(results_by_type)
-            summary["generalization_score"] = float(generalization_score)
-            summary["generalization_score_percentage"] = float(generalization_score * 100)
-            
-            # 记录各类型问题的平均得分（用于分析）
-            type_avg_scores = {}
-            for q_type, scores in results_by_type.items():
-                if scores:
-                    type_avg_scores[f"{q_type}_avg_score"] = float(np.mean(scores))
-            if type_avg_scores:
-                summary.update(type_avg_scores)
-    
-    # 生成优化建议（基于论文的核心指标）
-    optimization_suggestions = []
-    
-    # 核心指标1：Factual Correctness（事实正确性）
-    if "ragas_factual_correctness_score" in summary:
-        factual = summary.get("ragas_factual_correctness_score", 0.0) or 0.0
-        if factual < 0.7:
-            optimization_suggestions.append({
-                "category": "答案质量优化",
-                "metric": "事实正确性（Factual Correctness）",
-                "current_value": f"{factual:.2%}",
-                "suggestion": "事实正确性得分较低，建议优化生成模型或提示词，确保答案包含正确事实，减少错误事实和遗漏"
-            })
-    
-    # 核心指标2：Faithfulness（忠实度）
-    if "ragas_faithfulness_score" in summary:
-        faithfulness = summary.get("ragas_faithfulness_score", 0.0) or 0.0
-        if faithfulness < 0.7:
-            optimization_suggestions.append({
-                "category": "答案质量优化",
-                "metric": "忠实度（Faithfulness）",
-                "current_value": f"{faithfulness:.2%}",
-                "suggestion": "忠实度得分较低，说明答案可能包含上下文之外的信息或编造内容，建议优化生成模型，确保答案基于提供的上下文"
-            })
-    
-    # 辅助指标：Context Relevance（上下文相关性）
-    if "ragas_context_relevance_score" in summary:
-        context_relevance = summary.get("ragas_context_relevance_score", 0.0) or 0.0
-        if context_relevance < 0.7:
-            optimization_suggestions.append({
-                "category": "检索优化",
-                "metric": "上下文相关性（Context Relevance）",
-                "current_value": f"{context_relevance:.2%}",
-                "suggestion": "上下文相关性得分较低，建议优化检索系统：检查嵌入模型、调整top_k参数、优化查询理解"
-            })
-    
-    # 辅助指标：Answer Relevancy（答案相关性）
-    if "ragas_relevancy_score" in summary:
-        relevancy = summary.get("ragas_relevancy_score", 0.0) or 0.0
-        if relevancy < 0.7:
-            optimization_suggestions.append({
-                "category": "提示词优化",
-                "metric": "答案相关性（Answer Relevancy）",
-                "current_value": f"{relevancy:.2%}",
-                "suggestion": "答案相关性得分较低，建议优化提示词工程，提高答案与问题的相关性，减少无关信息"
-            })
-    
-    # 兼容旧字段
-    if "ragas_quality_score" in summary:
-        quality = summary.get("ragas_quality_score", 0.0) or 0.0
-        if quality < 0.7:
-            optimization_suggestions.append({
-                "category": "答案质量优化",
-                "metric": "答案质量得分",
-                "current_value": f"{quality:.2%}",
-                "suggestion": "答案质量得分较低，建议优化提示词，提高答案的准确性、完整性和一致性"
-            })
-    
-    # 检索优化建议
-    if "recall_at_10" in summary:
-        recall_10 = summary.get("recall_at_10", 0.0) or 0.0
-        if recall_10 < 0.8:
-            optimization_suggestions.append({
-                "category": "检索优化",
-                "metric": "召回率@10",
-                "current_value": f"{recall_10:.2%}",
-                "suggestion": "召回率@10较低，建议优化检索系统：检查嵌入模型、调整top_k参数、降低相似度阈值"
-            })
-    
-    if "recall_at_5" in summary:
-        recall_5 = summary.get("recall_at_5", 0.0) or 0.0
-        if recall_5 < 0.7:
-            optimization_suggestions.append({
-                "category": "检索优化",
-                "metric": "召回率@5",
-                "current_value": f"{recall_5:.2%}",
-                "suggestion": "召回率@5较低，建议优化检索系统：考虑使用重排序模型、调整向量相似度权重"
-            })
-    
-    # 泛化性优化建议
-    if "generalization_score" in summary:
-        generalization = summary.get("generalization_score", 0.0) or 0.0
-        if generalization < 0.6:
-            optimization_suggestions.append({
-                "category": "系统优化",
-                "metric": "泛化性得分",
-                "current_value": f"{generalization:.2%}",
-                "suggestion": "泛化性得分较低，系统对不同类型问题的处理能力不均衡，建议检查特定类型问题的处理逻辑"
-            })
-    
-    if optimization_suggestions:
-        summary["optimization_suggestions"] = optimization_suggestions
-    
-    # 计算总时间（在保存前添加到summary）
-    total_time = time.time() - start_time
-    summary["total_time"] = total_time
-    summary["load_time"] = load_time
-    summary["ragas_init_time"] = ragas_init_time if mode in ("ragas", "hybrid") else 0
-    summary["evaluation_time"] = evaluation_time
-    summary["avg_time_per_question"] = total_time / total if total > 0 else 0
-    
-    # 保存结果
-    save_start = time.time()
-    results_csv_path = output_dir / "evaluation_results.csv"
-    df.to_csv(results_csv_path, index=False, encoding="utf-8-sig")
-    
-    summary_json_path = output_dir / "evaluation_summary.json"
-    with open(summary_json_path, "w", encoding="utf-8") as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
+        # 计算总时间（在保存前添加到summary）
+        total_time = time.time() - start_time
+        summary["total_time"] = total_time
+        summary["load_time"] = load_time
+        summary["ragas_init_time"] = ragas_init_time if mode in ("ragas", "hybrid") else 0
+        summary["evaluation_time"] = evaluation_time
+        summary["avg_time_per_question"] = total_time / total if total > 0 else 0
+        
+        # 保存结果
+        save_start = time.time()
+        results_csv_path = output_dir / "evaluation_results.csv"
+        summary_json_path = output_dir / "evaluation_summary.json"
+        # 两个文件互不依赖，放到线程池中同时写出，也避免大 CSV 写盘期间阻塞事件循环
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            loop.run_in_executor(None, spool.write_csv, results_csv_path),
+            loop.run_in_executor(None, _write_json_file, summary_json_path, summary),
+        )
     save_time = time.time() - save_start
     logger.info(f"保存结果完成: 耗时 {save_time:.2f} 秒")
     
@@ -8,6 +8,7 @@ Ragas 评测器封装 - 基于论文2407.12873v1优化的评估指标实现
 
 参考论文：Evaluation of RAG Metrics for Question Answering in the Telecom Domain
 """
+import asyncio
 import logging
 import os
 import json
@@ -475,28 +476,29 @@ Please respond in JSON format with keys: "TP", "FP", "FN". Each value should be
         Returns:
             综合评测结果字典
         """
-        results = {}
+        # 各指标互不依赖，并发发起 LLM 请求：单个用例的耗时从各指标耗时之和降为最慢的一个。
+        # 每个 evaluate_* 方法内部已捕获异常，gather 不会因单个指标失败而中断
+        metric_tasks = {}
         
         # 核心指标1：Faithfulness（如果有上下文）
         if context:
-            faithfulness_result = await self.evaluate_faithfulness(answer, context)
-            results["faithfulness"] = faithfulness_result
+            metric_tasks["faithfulness"] = self.evaluate_faithfulness(answer, context)
         
         # 核心指标2：Factual Correctness（如果有ground truth）
         # 如果没有ground_truth，尝试使用reference作为ground_truth
         gt = ground_truth or reference
         if gt:
-            factual_result = await self.evaluate_factual_correctness(question, answer, gt)
-            results["factual_correctness"] = factual_result
+            metric_tasks["factual_correctness"] = self.evaluate_factual_correctness(question, answer, gt)
         
         # 辅助指标：Context Relevance（评估检索质量）
         if context:
-            context_relevance_result = await self.evaluate_context_relevance(question, context)
-            results["context_relevance"] = context_relevance_result
+            metric_tasks["context_relevance"] = self.evaluate_context_relevance(question, context)
         
         # 辅助指标：Answer Relevancy（用户满意度）
-        relevancy_result = await self.evaluate_answer_relevancy(question, answer)
-        results["answer_relevancy"] = relevancy_result
+        metric_tasks["answer_relevancy"] = self.evaluate_answer_relevancy(question, answer)
+        
+        metric_results = await asyncio.gather(*metric_tasks.values())
+        results = dict(zip(metric_tasks.keys(), metric_results))
         
         # 计算综合得分：优先使用Factual Correctness + Faithfulness的组合
         # 根据论文，这两个是最重要的指标